@@ -0,0 +1,73 @@
+import re
+from typing import List, Optional
+
+from rich.ansi import AnsiDecoder
+from rich.control import strip_control_codes
+from rich.style import Style
+from rich.text import Text
+
+# An escape sequence cut off at the end of a chunk (no final byte yet).
+_INCOMPLETE_ESCAPE = re.compile(r"\x1b(\[[0-?]*[ -/]*|\][^\x07\x1b]*)?$")
+
+
+class IncrementalAnsiDecoder:
+    """Turn a stream of terminal output into Rich ``Text`` lines, chunk by chunk.
+
+    Every completed line is decoded exactly once, carrying the SGR state over
+    to the next line. Only the unfinished last line is kept as raw text (it
+    may end half-way through an escape sequence) until its newline arrives.
+    """
+
+    def __init__(self, style: Optional[str] = None, max_partial: int = 65536):
+        self._decoder = AnsiDecoder()
+        self._base = Style.parse(style) if style else None
+        self.max_partial = max_partial
+        self.partial = ""
+
+    def feed(self, text: str, limit: Optional[int] = None) -> List[Text]:
+        """Decode ``text`` and return the lines it completed.
+
+        With ``limit``, only the last ``limit`` lines are returned; earlier
+        ones are only scanned for style changes.
+        """
+        *lines, self.partial = (self.partial + text).split("\n")
+        if len(self.partial) > self.max_partial:
+            # A runaway line without newlines: wrap it rather than grow forever.
+            lines.append(self.partial)
+            self.partial = ""
+        if limit is not None and len(lines) > limit:
+            for line in lines[:-limit]:
+                if "\x1b" in line:
+                    self._decoder.decode_line(line)
+            lines = lines[-limit:]
+        return [self._decode(line) for line in lines]
+
+    def flush(self) -> List[Text]:
+        """Decode whatever is left once the stream has ended."""
+        if not self.partial:
+            return []
+        line, self.partial = self.partial, ""
+        return [self._decode(line)]
+
+    def preview(self) -> Text:
+        """The unfinished line as it would look now, without consuming it."""
+        saved = self._decoder.style
+        try:
+            return self._decode(_INCOMPLETE_ESCAPE.sub("", self.partial))
+        finally:
+            self._decoder.style = saved
+
+    def _decode(self, line: str) -> Text:
+        if line.endswith("\r"):
+            line = line[:-1]
+        if "\x1b" in line:
+            decoded = self._decoder.decode_line(line)
+        else:
+            # Plain output is by far the common case; skip the tokenizer.
+            decoded = Text(strip_control_codes(line.rsplit("\r", 1)[-1]))
+            if self._decoder.style:
+                # A span rather than Text.style: Text.render ignores the latter for span-less lines.
+                decoded.stylize(self._decoder.style)
+        if self._base is not None:
+            decoded.stylize_before(self._base)
+        return decoded
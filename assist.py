@@ -0,0 +1,77 @@
+import os
+import platform
+import re
+from typing import List, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from llm import LLMError, llm
+
+# Ask for the command, its explanation and follow-up suggestions of an `nl:`
+# request in one LLM call instead of three.
+COMBINED_NL = os.getenv("TARA_COMBINED_NL", "1").lower() in ("1", "true", "yes", "on")
+
+_FENCE = re.compile(r"^```(?:\w+)?\s*|\s*```$")
+_NUMBERING = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+
+
+class Assistance(BaseModel):
+    """Everything StudentTARA shows for an `nl:` request, from a single reply."""
+
+    command: str
+    explanation: str = ""
+    suggestions: List[str] = []
+
+    @field_validator("command")
+    @classmethod
+    def _plain_command(cls, command: str) -> str:
+        command = _FENCE.sub("", command.strip()).strip()
+        if not command:
+            raise ValueError("the command is empty")
+        return command
+
+    @field_validator("suggestions", mode="before")
+    @classmethod
+    def _suggestion_list(cls, suggestions):
+        if isinstance(suggestions, str):
+            suggestions = suggestions.splitlines()
+        return suggestions
+
+    @field_validator("suggestions")
+    @classmethod
+    def _clean_suggestions(cls, suggestions: List[str]) -> List[str]:
+        return [_NUMBERING.sub("", s).strip() for s in suggestions if s.strip()][:3]
+
+
+def _prompt() -> str:
+    return (
+        f"Convert the user's request into a command for a {platform.system()} terminal. "
+        'Reply with a JSON object and nothing else: {"command": the command as plain text, '
+        '"explanation": one short sentence explaining it, '
+        '"suggestions": a list of 3 useful follow-up commands}.'
+    )
+
+
+def parse_assistance(reply: str) -> Optional[Assistance]:
+    """The validated reply, or None if it is not the JSON object that was asked for."""
+    try:
+        return Assistance.model_validate_json(_FENCE.sub("", reply.strip()))
+    except ValidationError:
+        return None
+
+
+async def assist(nl_query: str) -> Optional[Assistance]:
+    """Translate, explain and suggest follow-ups for ``nl_query`` in one call.
+
+    Returns None when the call fails or the reply does not validate, so the
+    caller can fall back to asking for each part separately.
+    """
+    try:
+        reply = await llm.chat([
+            {"role": "system", "content": _prompt()},
+            {"role": "user", "content": nl_query},
+        ], cache=True, cache_if=lambda reply: parse_assistance(reply) is not None, site="assist",
+            response_format={"type": "json_object"})
+    except LLMError:
+        return None
+    return parse_assistance(reply)
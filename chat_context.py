@@ -0,0 +1,103 @@
+import os
+from typing import Dict, List
+
+from llm import LLMError, llm
+from llm_backends import estimate_tokens
+
+# Tokens a chat request (system prompt, summary and recent turns) may use.
+CHAT_TOKEN_BUDGET = int(os.getenv("TARA_CHAT_TOKENS", "2000"))
+# Size the rolling summary of older turns is kept under.
+SUMMARY_TOKENS = 250
+# Per-message overhead of the chat format (role, separators).
+MESSAGE_OVERHEAD = 4
+
+Message = Dict[str, str]
+
+_SUMMARY_PROMPT = (
+    "You keep notes on a terminal tutoring conversation. Update the notes with the new turns. "
+    "Keep what later answers may need: the user's system and setup, their goals, commands and "
+    "concepts already explained, and open questions. Use at most {words} words, no preamble."
+)
+
+
+def message_tokens(message: Message) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def _truncate(text: str, tokens: int) -> str:
+    if estimate_tokens(text) <= tokens:
+        return text
+    cut = max(tokens - 1, 0) * 4
+    while cut and estimate_tokens(text[:cut]) >= tokens:
+        cut = cut * 3 // 4
+    return text[:cut] + "…"
+
+
+class ChatContext:
+    """Builds chat requests that fit a token budget, however long the chat gets.
+
+    Each request holds the system prompt, a rolling summary of the older turns
+    and as many recent turns as fit in ``budget``. Turns that no longer fit are
+    folded into the summary by ``compact``, which runs in the background after
+    an answer, so asking a question never waits for it; until it has caught
+    up, the turns in between are simply left out.
+    """
+
+    def __init__(self, system: str, budget: int = CHAT_TOKEN_BUDGET, summary_tokens: int = SUMMARY_TOKENS):
+        self.system = system
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        # Turns at the start of the history that the summary covers.
+        self.summarized = 0
+        self._compacting = False
+
+    def _window(self, history: List[Message], budget: int) -> int:
+        """Index of the oldest turn that fits in ``budget`` together with the newer ones."""
+        start = len(history)
+        used = 0
+        while start > 0:
+            cost = message_tokens(history[start - 1])
+            if used + cost > budget and start < len(history):
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def build(self, history: List[Message]) -> List[Message]:
+        """The messages to send for a reply to the last turn of ``history``."""
+        system = {"role": "system", "content": self.system}
+        if self.summary:
+            system["content"] += f"\n\nEarlier in this conversation:\n{self.summary}"
+        budget = self.budget - message_tokens(system)
+        # Turns the summary covers are not sent a second time.
+        start = max(self._window(history, budget), self.summarized)
+        turns = history[start:]
+        if turns and message_tokens(turns[0]) > budget:
+            # Only the latest message is left and even that is too long.
+            turns = [dict(turns[0], content=_truncate(turns[0]["content"], budget - MESSAGE_OVERHEAD))]
+        return [system] + turns
+
+    async def compact(self, history: List[Message]) -> None:
+        """Fold the turns that no longer fit into the request into the summary."""
+        if self._compacting:
+            return
+        budget = self.budget - message_tokens({"content": self.system}) - self.summary_tokens
+        if self._window(history, budget) <= self.summarized:
+            return  # every turn not in the summary still fits
+        # Fold down to half the budget, so this happens every few turns rather than after each one.
+        end = self._window(history, max(budget // 2, 0))
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in history[self.summarized:end])
+        notes = f"Notes so far:\n{self.summary}\n\n" if self.summary else ""
+        self._compacting = True
+        try:
+            summary = await llm.chat([
+                {"role": "system", "content": _SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4)},
+                {"role": "user", "content": f"{notes}New turns:\n{_truncate(transcript, self.budget)}"},
+            ], max_tokens=self.summary_tokens, site="chat_summary")
+        except LLMError:
+            return
+        finally:
+            self._compacting = False
+        self.summary = _truncate(summary, self.summary_tokens)
+        self.summarized = end
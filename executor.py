@@ -0,0 +1,878 @@
+import asyncio
+import codecs
+import fcntl
+import heapq
+import os
+import re
+import resource
+import secrets
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import termios
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+READ_SIZE = 65536
+# Characters of each stream kept in memory; the rest only lives in the spill file.
+HEAD_LIMIT = int(os.getenv("TARA_OUTPUT_HEAD", "16384"))
+TAIL_LIMIT = int(os.getenv("TARA_OUTPUT_TAIL", "16384"))
+# Wall-clock limit for foreground commands in seconds (0 disables it).
+COMMAND_TIMEOUT = float(os.getenv("TARA_COMMAND_TIMEOUT", "0"))
+# How long a cancelled command gets after SIGINT before it is SIGKILLed.
+CANCEL_GRACE = float(os.getenv("TARA_CANCEL_GRACE", "2"))
+# Run foreground commands on a pseudo-terminal by default (see the `pty` builtin).
+USE_PTY = os.getenv("TARA_PTY", "0").lower() in ("1", "true", "yes", "on")
+# Longest gap in seconds between memory samples of a running foreground command.
+RSS_SAMPLE_INTERVAL = 0.25
+
+
+class OutputChunk(NamedTuple):
+    """A piece of command output, tagged with the stream it came from."""
+    timestamp: datetime
+    stream: str
+    text: str
+
+
+ChunkCallback = Callable[[OutputChunk], None]
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ResourceUsage(NamedTuple):
+    """What a finished command cost.
+
+    CPU times cover the command's whole process tree. ``max_rss`` (bytes) is
+    the peak of the largest process. It is None when it could not be
+    measured: for background jobs whose peak stayed below TARA's own, and
+    for commands run in the shell session when they start no process or
+    /proc is unavailable (their processes are sampled while they run, see
+    ``_MemorySampler``).
+    """
+    returncode: int
+    wall_time: float
+    user_time: float
+    sys_time: float
+    max_rss: Optional[int]
+    stdout_bytes: int
+    stderr_bytes: int
+
+    def summary(self) -> str:
+        parts = [f"exit {self.returncode}", f"{self.wall_time:.2f}s wall",
+                 f"{self.user_time:.2f}s user", f"{self.sys_time:.2f}s sys"]
+        if self.max_rss is not None:
+            parts.append(f"{format_size(self.max_rss)} max RSS")
+        parts.append(f"{format_size(self.stdout_bytes)} out")
+        parts.append(f"{format_size(self.stderr_bytes)} err")
+        return ", ".join(parts)
+
+
+_TIMES = re.compile(r"(\d+)m([\d.]+)s")
+
+
+# One directory holds every temporary file of the session (the shell state
+# for background jobs, spill files unless they are kept), so they can all be
+# removed at the end.
+_spill_dir: Optional[tempfile.TemporaryDirectory] = None
+# Where the full output of truncated commands is kept after the session (see
+# ``keep_output_in``); None spills it into the temporary directory.
+_output_dir: Optional[str] = None
+
+
+def spill_directory() -> str:
+    """The session's directory for temporary files, created on first use."""
+    global _spill_dir
+    if _spill_dir is None:
+        _spill_dir = tempfile.TemporaryDirectory(prefix="tara-output-")
+    return _spill_dir.name
+
+
+def keep_output_in(directory: str) -> None:
+    """Spill the full output of truncated commands into ``directory``, which outlives the session."""
+    global _output_dir
+    _output_dir = os.path.abspath(directory)  # TARA follows the shell's cd
+
+
+def output_directory() -> str:
+    """The directory spill files go to, created on first use."""
+    if _output_dir is None:
+        return spill_directory()
+    os.makedirs(_output_dir, exist_ok=True)
+    return _output_dir
+
+
+def remove_spill_files() -> None:
+    """Delete the session's temporary files, and the spilled output unless it is kept elsewhere."""
+    global _spill_dir
+    if _spill_dir is not None:
+        _spill_dir.cleanup()
+        _spill_dir = None
+
+
+def _parse_times(report: str) -> Tuple[float, float]:
+    """User and system CPU of a shell's children from its ``times`` output."""
+    values = [int(m) * 60 + float(sec) for m, sec in _TIMES.findall(report)]
+    if len(values) < 4:
+        return 0.0, 0.0
+    return values[2], values[3]
+
+
+class OutputCapture:
+    """Bounded capture of a single output stream.
+
+    Only the first ``head_limit`` and last ``tail_limit`` characters are kept
+    in memory. As soon as the stream outgrows that, everything (including what
+    was already captured) is written to a spill file so the full output stays
+    reachable through ``read_full``/``spill_path``. Spill files are kept in
+    ``output_directory()``; without ``keep_output_in`` they are temporary and
+    go away with ``remove_spill_files``.
+    """
+
+    def __init__(self, stream: str, head_limit: int = HEAD_LIMIT, tail_limit: int = TAIL_LIMIT):
+        self.stream = stream
+        self.head_limit = head_limit
+        self.tail_limit = tail_limit
+        self.head: List[OutputChunk] = []
+        self.tail: Deque[OutputChunk] = deque()
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.spill_path: Optional[str] = None
+        self._head_size = 0
+        self._tail_size = 0
+        self._spill = None
+        self._ends_with_newline = True
+
+    @property
+    def truncated(self) -> bool:
+        return self.spill_path is not None
+
+    def append(self, chunk: OutputChunk) -> None:
+        text = chunk.text
+        self.total_bytes += len(text.encode("utf-8", errors="replace"))
+        self.total_lines += text.count("\n")
+        self._ends_with_newline = text.endswith("\n")
+
+        if self._spill is None and self._head_size + self._tail_size + len(text) > self.head_limit + self.tail_limit:
+            self._start_spill()
+        if self._spill is not None:
+            self._spill.write(text)
+
+        room = self.head_limit - self._head_size
+        if room > 0:
+            head_part = text[:room]
+            self.head.append(chunk._replace(text=head_part))
+            self._head_size += len(head_part)
+            text = text[room:]
+            if not text:
+                return
+            chunk = chunk._replace(text=text)
+
+        self.tail.append(chunk)
+        self._tail_size += len(text)
+        while self.tail and self._tail_size - len(self.tail[0].text) >= self.tail_limit:
+            self._tail_size -= len(self.tail.popleft().text)
+        if self._tail_size > self.tail_limit:
+            first = self.tail[0]
+            cut = self._tail_size - self.tail_limit
+            self.tail[0] = first._replace(text=first.text[cut:])
+            self._tail_size -= cut
+
+    def _start_spill(self) -> None:
+        fd, self.spill_path = tempfile.mkstemp(prefix=f"tara-{self.stream}-", suffix=".log", dir=output_directory())
+        self._spill = os.fdopen(fd, "w", encoding="utf-8", errors="replace")
+        for chunk in self.head:
+            self._spill.write(chunk.text)
+        for chunk in self.tail:
+            self._spill.write(chunk.text)
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def chunks(self) -> Iterator[OutputChunk]:
+        yield from self.head
+        yield from self.tail
+
+    @property
+    def line_count(self) -> int:
+        if not self.total_bytes:
+            return 0
+        return self.total_lines + (0 if self._ends_with_newline else 1)
+
+    def omitted_bytes(self) -> int:
+        kept = sum(len(c.text.encode("utf-8", errors="replace")) for c in self.chunks())
+        return self.total_bytes - kept
+
+    def text(self) -> str:
+        """The bounded view: head, an omission marker when truncated, then tail."""
+        head = "".join(c.text for c in self.head)
+        tail = "".join(c.text for c in self.tail)
+        if not self.truncated:
+            return head + tail
+        return (
+            f"{head}\n"
+            f"... [{self.omitted_bytes():,} bytes omitted; {self.total_bytes:,} bytes / "
+            f"{self.line_count:,} lines total, full output in {self.spill_path}] ...\n"
+            f"{tail}"
+        )
+
+    def read_full(self) -> str:
+        if not self.truncated:
+            return self.text()
+        if self._spill is not None:
+            self._spill.flush()
+        with open(self.spill_path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+
+def merge_chunks(*captures: OutputCapture) -> Iterator[OutputChunk]:
+    """Interleave the in-memory chunks of several captures in arrival order."""
+    return heapq.merge(*(c.chunks() for c in captures), key=lambda c: c.timestamp)
+
+
+async def _pump(reader: asyncio.StreamReader, capture: OutputCapture,
+                on_chunk: Optional[ChunkCallback]) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = await reader.read(READ_SIZE)
+        text = decoder.decode(data, final=not data)
+        if text:
+            chunk = OutputChunk(datetime.now(), capture.stream, text)
+            capture.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        if not data:
+            break
+    capture.close()
+
+
+def format_output(stdout: OutputCapture, stderr: OutputCapture) -> str:
+    output_parts = []
+    if stdout.total_bytes:
+        output_parts.append(f"Stdout:\n{stdout.text().strip()}")
+    if stderr.total_bytes:
+        output_parts.append(f"Stderr:\n{stderr.text().strip()}")
+
+    if not output_parts:
+        return "(Command produced no output)"
+    return "\n\n".join(output_parts)
+
+
+class CommandResult:
+    """Outcome of one command: its two output captures and how it ended.
+
+    Nothing is formatted up front; ``text()`` builds the display string from
+    the bounded captures whenever a panel, the log or the history asks for it.
+    ``message`` replaces the output for results that are not really command
+    output (errors starting the command, "Changed directory to ...").
+    """
+
+    __slots__ = ("command", "stdout", "stderr", "usage", "interrupted", "message")
+
+    def __init__(self, command: str, stdout: Optional[OutputCapture] = None,
+                 stderr: Optional[OutputCapture] = None, usage: Optional[ResourceUsage] = None,
+                 interrupted: Optional[str] = None, message: Optional[str] = None):
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.usage = usage
+        self.interrupted = interrupted
+        self.message = message
+
+    @property
+    def captures(self) -> List[OutputCapture]:
+        return [c for c in (self.stdout, self.stderr) if c is not None]
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.usage.returncode if self.usage else None
+
+    @property
+    def truncated(self) -> bool:
+        return any(c.truncated for c in self.captures)
+
+    @property
+    def output_files(self) -> List[str]:
+        return [c.spill_path for c in self.captures if c.truncated]
+
+    def text(self) -> str:
+        if self.message is not None:
+            return self.message
+        if self.stdout is None or self.stderr is None:
+            return "(Command produced no output)"
+        text = format_output(self.stdout, self.stderr)
+        if self.interrupted:
+            text = f"(Command {self.interrupted}, exit code {self.returncode})\n\n{text}"
+        return text
+
+    def __repr__(self) -> str:
+        return f"CommandResult({self.command!r}, returncode={self.returncode!r}, interrupted={self.interrupted!r})"
+
+
+class _PtyCapture:
+    """A pseudo-terminal a single command writes to instead of the session's pipes.
+
+    Programs see a real tty on stdout/stderr, so they keep colour and line
+    buffering on. Both streams arrive merged, as in a terminal, and are
+    recorded as stdout.
+    """
+
+    def __init__(self, capture: OutputCapture, on_chunk: Optional[ChunkCallback],
+                 columns: int = 80, rows: int = 24):
+        self.capture = capture
+        self.on_chunk = on_chunk
+        self.master, self.slave = os.openpty()
+        self.path = os.ttyname(self.slave)
+        attrs = termios.tcgetattr(self.slave)
+        attrs[1] &= ~termios.ONLCR  # keep "\n" line endings
+        termios.tcsetattr(self.slave, termios.TCSANOW, attrs)
+        fcntl.ioctl(self.slave, termios.TIOCSWINSZ, struct.pack("HHHH", rows, columns, 0, 0))
+        os.set_blocking(self.master, False)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.master, self._read)
+
+    def _emit(self, data: bytes, final: bool = False) -> None:
+        text = self._decoder.decode(data, final=final)
+        if text:
+            chunk = OutputChunk(datetime.now(), self.capture.stream, text)
+            self.capture.append(chunk)
+            if self.on_chunk is not None:
+                self.on_chunk(chunk)
+
+    def _read(self) -> bool:
+        try:
+            data = os.read(self.master, READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            # EIO: nothing holds the slave side open any more.
+            return False
+        if data:
+            self._emit(data)
+        return bool(data)
+
+    def close(self) -> None:
+        """Stop watching the pty and drain what the finished command left in it."""
+        self._loop.remove_reader(self.master)
+        os.close(self.slave)
+        while self._read():
+            pass
+        self._emit(b"", final=True)
+        os.close(self.master)
+
+
+def _shell_quote(text: str) -> str:
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+class ShellSession:
+    """A long-lived shell coprocess shared by every command in a TARA session.
+
+    Commands are written to the shell's stdin and framed with a random
+    sentinel that the shell prints, together with ``$?`` and ``$PWD``, once the
+    command finishes. ``cd``, exported variables, aliases and sourced files
+    therefore persist between commands exactly like in a normal terminal.
+    After each command the shell also saves its exported variables, aliases
+    and functions, which background jobs start from (see ``job_argv``).
+    """
+
+    def __init__(self, shell: Optional[str] = None, rc_file: Optional[str] = None):
+        if shell is None:
+            shell = os.getenv("TARA_SHELL") or ("/bin/bash" if os.path.exists("/bin/bash") else "/bin/sh")
+        self.shell = shell
+        if rc_file is None and os.path.basename(shell) == "bash":
+            rc_file = os.getenv("TARA_SHELL_RC", "~/.bashrc")
+        self.rc_file = rc_file
+        self.cwd = os.getcwd()
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self._token = f"__TARA_{secrets.token_hex(8)}"
+        self._counter = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._done: Optional[asyncio.Event] = None
+        self._interrupted: Optional[str] = None
+        self._interrupt_task: Optional[asyncio.Future] = None
+        self._child_cpu = (0.0, 0.0)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    @property
+    def is_bash(self) -> bool:
+        return os.path.basename(self.shell) == "bash"
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(spill_directory(), f"shell-state{self._token}.sh")
+
+    def job_argv(self, command: str) -> List[str]:
+        """argv that runs ``command`` like ``command &`` would in the session's shell.
+
+        The job gets the session's exported variables, aliases and functions
+        as of the last command; changes it makes do not come back.
+        """
+        setup = []
+        if self.is_bash:
+            setup.append("shopt -s expand_aliases")
+        state = self.state_path
+        if os.path.exists(state):
+            # Re-declaring read-only variables fails harmlessly; keep that quiet.
+            setup.append(f". {_shell_quote(state)} 2>/dev/null")
+        elif self.rc_file:
+            rc = _shell_quote(os.path.expanduser(self.rc_file))
+            setup.append(f"[ -f {rc} ] && . {rc} </dev/null >/dev/null 2>&1")
+        # Separate lines, so aliases defined by the setup apply to the command.
+        return [self.shell, "-c", "\n".join(setup + [command])]
+
+    @property
+    def busy(self) -> bool:
+        return self._lock is not None and self._lock.locked()
+
+    async def start(self) -> None:
+        argv = [self.shell]
+        if self.is_bash:
+            argv += ["--noprofile", "--norc"]
+        self.proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        self._child_cpu = (0.0, 0.0)
+        setup = []
+        if self.is_bash:
+            setup.append("shopt -s expand_aliases")
+        if self.rc_file:
+            rc = _shell_quote(os.path.expanduser(self.rc_file))
+            setup.append(f"[ -f {rc} ] && . {rc} </dev/null >/dev/null 2>&1")
+        # Job control puts every pipeline in its own process group so it can be
+        # interrupted on its own; the no-op trap keeps a child's SIGINT from
+        # taking the whole (non-interactive) shell down with it.
+        setup += ["set -m", "trap : INT"]
+        # Framed like a normal command so that rc-file noise is discarded.
+        await self._run_locked("; ".join(setup), None)
+
+    async def run(self, command: str, on_chunk: Optional[ChunkCallback] = None,
+                  timeout: float = COMMAND_TIMEOUT, pty: bool = False,
+                  columns: int = 80, on_start: Optional[Callable[[], None]] = None) -> CommandResult:
+        """Run ``command`` in the session, handing each output chunk to ``on_chunk`` as it arrives.
+
+        ``on_start`` is called once the command actually starts, i.e. after
+        the command before it has finished. With ``pty`` the command's stdout and stderr go to a pseudo-terminal
+        ``columns`` wide instead of a pipe. ``interrupted`` on the result says
+        why the command was stopped ("cancelled", "timed out"), if it was.
+        """
+        if self._lock is None:
+            # Created lazily so it binds to the running event loop.
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.alive:
+                await self.start()
+            if on_start is not None:
+                on_start()
+            timer = None
+            if timeout > 0:
+                timer = asyncio.get_running_loop().call_later(
+                    timeout, lambda: self._spawn_interrupt("timed out"))
+            try:
+                return await self._run_locked(command, on_chunk, pty, columns)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def _spawn_interrupt(self, reason: str) -> None:
+        self._interrupt_task = asyncio.ensure_future(self.interrupt(reason))
+
+    async def interrupt(self, reason: str = "cancelled", grace: float = CANCEL_GRACE) -> None:
+        """Stop the running command: SIGINT its process groups, then SIGKILL them.
+
+        If the shell is still busy after that (e.g. a loop made only of
+        builtins), the shell itself is killed and restarted on the next command.
+        """
+        done = self._done
+        if done is None or done.is_set() or not self.alive:
+            return
+        self._interrupted = self._interrupted or reason
+        for sig in (signal.SIGINT, signal.SIGKILL):
+            for pgid in await self._command_groups():
+                try:
+                    os.killpg(pgid, sig)
+                except ProcessLookupError:
+                    pass
+            try:
+                await asyncio.wait_for(done.wait(), timeout=grace)
+                return
+            except asyncio.TimeoutError:
+                pass
+        if self.alive:
+            self.proc.kill()
+
+    async def _command_groups(self) -> List[int]:
+        """Process groups in the shell's session other than the shell's own."""
+        try:
+            pgrep = await asyncio.create_subprocess_exec(
+                "pgrep", "-s", str(self.proc.pid),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+            out, _ = await pgrep.communicate()
+        except FileNotFoundError:
+            return []
+        groups = set()
+        for pid in out.split():
+            try:
+                pgid = os.getpgid(int(pid))
+            except (ProcessLookupError, ValueError):
+                continue
+            if pgid != self.proc.pid:
+                groups.add(pgid)
+        return sorted(groups)
+
+    async def _run_locked(self, command: str, on_chunk: Optional[ChunkCallback], pty: bool = False,
+                          columns: int = 80) -> CommandResult:
+        self._done = asyncio.Event()
+        self._interrupted = None
+        try:
+            usage, stdout, stderr = await self._exchange(command, on_chunk, pty, columns)
+        finally:
+            self._done.set()
+        return CommandResult(command, stdout, stderr, usage, self._interrupted)
+
+    async def _exchange(self, command: str, on_chunk: Optional[ChunkCallback], pty: bool,
+                        columns: int) -> Tuple[ResourceUsage, OutputCapture, OutputCapture]:
+        self._counter += 1
+        marker = f"{self._token}_{self._counter}__"
+        stdout, stderr = OutputCapture("stdout"), OutputCapture("stderr")
+        terminal = _PtyCapture(stdout, on_chunk, columns) if pty else None
+        redirect = f" >{_shell_quote(terminal.path)} 2>&1" if terminal else ""
+        # Builtins only, so saving the state costs no extra process.
+        state = "export -p; alias -p; declare -f" if self.is_bash else "export -p"
+        # `times` reports the CPU used by the shell's (reaped) children so far;
+        # it follows the stderr sentinel and is diffed against the last report.
+        script = (
+            f"eval {_shell_quote(command)} </dev/null{redirect}\n"
+            f"__tara_rc=$?; {{ {state}; }} >{_shell_quote(self.state_path)} 2>/dev/null; "
+            f"printf '%s %d %s\\n' '{marker}' \"$__tara_rc\" \"$PWD\"; "
+            f"printf '%s ' '{marker}' >&2; times >&2\n"
+        )
+        marker_bytes = marker.encode()
+        started = time.monotonic()
+        memory = _MemorySampler(self.proc.pid)
+        try:
+            self.proc.stdin.write(script.encode())
+            await self.proc.stdin.drain()
+            status, times = await asyncio.gather(
+                self._pump_until(self.proc.stdout, stdout, marker_bytes, on_chunk),
+                self._pump_until(self.proc.stderr, stderr, marker_bytes, on_chunk, lines=2),
+            )
+        finally:
+            max_rss = memory.stop()
+            if terminal is not None:
+                terminal.close()
+        stdout.close()
+        stderr.close()
+        if status is None:
+            # The shell itself went away (`exit`, or killed by interrupt()).
+            returncode = await self.proc.wait()
+            self.proc = None
+            note = OutputChunk(datetime.now(), "stderr",
+                               "[TARA] The shell session ended; a new one starts with the next command.\n")
+            stderr.append(note)
+            if on_chunk is not None:
+                on_chunk(note)
+            return self._usage(returncode, started, stdout, stderr, None, max_rss), stdout, stderr
+
+        rc, _, cwd = status.partition(" ")
+        self.cwd = cwd or self.cwd
+        return self._usage(int(rc), started, stdout, stderr, times, max_rss), stdout, stderr
+
+    def _usage(self, returncode: int, started: float, stdout: OutputCapture, stderr: OutputCapture,
+               times: Optional[str], max_rss: Optional[int]) -> ResourceUsage:
+        user = system = 0.0
+        if times:
+            cpu = _parse_times(times)
+            user, system = cpu[0] - self._child_cpu[0], cpu[1] - self._child_cpu[1]
+            self._child_cpu = cpu
+        return ResourceUsage(returncode, time.monotonic() - started, max(user, 0.0), max(system, 0.0),
+                             max_rss, stdout.total_bytes, stderr.total_bytes)
+
+    @staticmethod
+    async def _pump_until(reader: asyncio.StreamReader, capture: OutputCapture, marker: bytes,
+                          on_chunk: Optional[ChunkCallback], lines: int = 1) -> Optional[str]:
+        """Capture output up to ``marker``; return the ``lines`` lines that follow it."""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def emit(data: bytes, final: bool = False) -> None:
+            text = decoder.decode(data, final=final)
+            if text:
+                chunk = OutputChunk(datetime.now(), capture.stream, text)
+                capture.append(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+
+        pending = b""
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                emit(pending, final=True)
+                return None
+            pending += data
+            idx = pending.find(marker)
+            if idx >= 0:
+                emit(pending[:idx], final=True)
+                rest = pending[idx + len(marker):]
+                while rest.count(b"\n") < lines:
+                    more = await reader.read(READ_SIZE)
+                    if not more:
+                        break
+                    rest += more
+                return b"\n".join(rest.split(b"\n")[:lines]).decode(errors="replace").strip()
+            # Only hold back what could be the start of a marker split across reads.
+            keep = _partial_marker(pending, marker)
+            emit(pending[:len(pending) - keep])
+            pending = pending[len(pending) - keep:]
+
+    async def close(self) -> None:
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.write(b"exit\n")
+            await self.proc.stdin.drain()
+            await asyncio.wait_for(self.proc.wait(), timeout=1)
+        except Exception:
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+        self.proc = None
+
+
+def _partial_marker(data: bytes, marker: bytes) -> int:
+    """Length of the longest end of ``data`` that is the beginning of ``marker``."""
+    start = data.find(marker[:1], max(len(data) - len(marker) + 1, 0))
+    while start >= 0:
+        if marker.startswith(data[start:]):
+            return len(data) - start
+        start = data.find(marker[:1], start + 1)
+    return 0
+
+
+def _descendants(pid: int) -> List[int]:
+    children: List[int] = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children += [int(child) for child in f.read().split()]
+    except OSError:  # gone, or no /proc
+        return []
+    return children + [d for child in children for d in _descendants(child)]
+
+
+def _peak_rss(pid: int) -> Optional[int]:
+    """Peak RSS in bytes of a process so far (VmHWM), or None if unknown."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class _MemorySampler:
+    """Tracks the largest peak RSS among a shell's child processes while a command runs.
+
+    The shell reaps the command's processes itself, so their rusage never
+    reaches TARA; instead their VmHWM is read from /proc, first after 10 ms
+    and then every ``RSS_SAMPLE_INTERVAL`` seconds at most. Processes that
+    come and go between two samples are missed.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak: Optional[int] = None
+        self._task = asyncio.ensure_future(self._sample())
+
+    async def _sample(self) -> None:
+        delay = 0.01
+        while True:
+            await asyncio.sleep(delay)
+            for rss in map(_peak_rss, _descendants(self.pid)):
+                if rss is not None and (self.peak is None or rss > self.peak):
+                    self.peak = rss
+            delay = min(delay * 2, RSS_SAMPLE_INTERVAL)
+
+    def stop(self) -> Optional[int]:
+        self._task.cancel()
+        return self.peak
+
+
+async def _pipe_reader(pipe) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader
+
+
+def _max_rss_bytes(ru_maxrss: int) -> int:
+    # Linux reports kilobytes, macOS bytes.
+    return ru_maxrss if sys.platform == "darwin" else ru_maxrss * 1024
+
+
+class Job:
+    """A command running in the background with its own output buffers.
+
+    Jobs run as separate processes, started with ``argv`` (by default
+    ``/bin/sh -c command``; see ``ShellSession.job_argv`` for one that carries
+    the session's variables, aliases and functions) in the session's working
+    directory. Like ``cmd &`` in bash they cannot change the session's state.
+    """
+
+    def __init__(self, job_id: int, command: str, cwd: str, argv: Optional[List[str]] = None):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd
+        self.argv = argv or ["/bin/sh", "-c", command]
+        self.stdout = OutputCapture("stdout")
+        self.stderr = OutputCapture("stderr")
+        self.listeners: List[ChunkCallback] = []
+        self.returncode: Optional[int] = None
+        self.interrupted: Optional[str] = None
+        self.started_at = datetime.now()
+        self.proc: Optional[subprocess.Popen] = None
+        self.task: Optional[asyncio.Task] = None
+        self.usage: Optional[ResourceUsage] = None
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._finished is None
+
+    @property
+    def duration(self) -> float:
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def status(self) -> str:
+        if self.running:
+            return "Running"
+        if self.interrupted:
+            return self.interrupted.capitalize()
+        return "Done" if self.returncode == 0 else f"Exit {self.returncode}"
+
+    @property
+    def result(self) -> CommandResult:
+        return CommandResult(f"{self.command} &", self.stdout, self.stderr, self.usage, self.interrupted)
+
+    def _on_chunk(self, chunk: OutputChunk) -> None:
+        for listener in list(self.listeners):
+            listener(chunk)
+
+    async def run(self) -> int:
+        loop = asyncio.get_running_loop()
+        rusage = None
+        own_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        try:
+            # A plain Popen that is reaped below with wait4() rather than by
+            # asyncio's child watcher, which would throw the rusage away.
+            self.proc = subprocess.Popen(
+                self.argv,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=self.cwd,
+                start_new_session=True,
+            )
+            await asyncio.gather(
+                _pump(await _pipe_reader(self.proc.stdout), self.stdout, self._on_chunk),
+                _pump(await _pipe_reader(self.proc.stderr), self.stderr, self._on_chunk),
+            )
+            _, status, rusage = await loop.run_in_executor(None, os.wait4, self.proc.pid, 0)
+            self.returncode = self.proc.returncode = os.waitstatus_to_exitcode(status)
+        except Exception as e:
+            chunk = OutputChunk(datetime.now(), "stderr", f"Error executing command: {e}\n")
+            self.stderr.append(chunk)
+            self._on_chunk(chunk)
+            self.returncode = -1
+        finally:
+            self._finished = time.monotonic()
+        self.usage = ResourceUsage(
+            self.returncode, self.duration,
+            rusage.ru_utime if rusage else 0.0, rusage.ru_stime if rusage else 0.0,
+            # The kernel charges the child with the memory it was forked from,
+            # so only a peak above TARA's own says anything about the job.
+            _max_rss_bytes(rusage.ru_maxrss) if rusage and rusage.ru_maxrss > own_rss else None,
+            self.stdout.total_bytes, self.stderr.total_bytes,
+        )
+        return self.returncode
+
+    def kill(self, sig: int = signal.SIGTERM) -> None:
+        if self.proc is None or not self.running:
+            return
+        try:
+            os.killpg(self.proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def interrupt(self, grace: float = CANCEL_GRACE) -> None:
+        """SIGINT the job's process group, then SIGKILL it if it does not exit in time."""
+        self.interrupted = self.interrupted or "cancelled"
+        for sig in (signal.SIGINT, signal.SIGKILL):
+            self.kill(sig)
+            try:
+                await asyncio.wait_for(asyncio.shield(self.task), timeout=grace)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+
+class JobTable:
+    """Background jobs of a session, addressed by ``%N`` like in bash."""
+
+    def __init__(self):
+        self.jobs: Dict[int, Job] = {}
+        self._next_id = 1
+
+    def start(self, command: str, cwd: str, on_done: Optional[Callable[[Job], None]] = None,
+              argv: Optional[List[str]] = None) -> Job:
+        job = Job(self._next_id, command, cwd, argv)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(job.run())
+        if on_done is not None:
+            job.task.add_done_callback(lambda _: on_done(job))
+        return job
+
+    def get(self, spec: str = "") -> Optional[Job]:
+        """Look up a job by ``%N``/``N``; an empty spec means the most recent job."""
+        spec = spec.strip().lstrip("%")
+        if not spec:
+            return self.jobs[max(self.jobs)] if self.jobs else None
+        try:
+            return self.jobs.get(int(spec))
+        except ValueError:
+            return None
+
+    def describe(self) -> str:
+        if not self.jobs:
+            return "(no jobs)"
+        return "\n".join(
+            f"[{job.id}]  {job.status:<8} {job.duration:7.1f}s  {job.command}"
+            for job in self.jobs.values()
+        )
+
+    def kill_all(self) -> None:
+        for job in self.jobs.values():
+            job.kill()
@@ -0,0 +1,242 @@
+import functools
+import os
+import re
+import shlex
+import subprocess
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from man_index import man_index
+
+# Shell builtins have no man page of their own.
+BUILTINS = {
+    "cd": "change the current directory",
+    "pwd": "print the current directory",
+    "echo": "print its arguments",
+    "export": "set environment variables for later commands",
+    "unset": "remove variables",
+    "source": "run a script in the current shell",
+    ".": "run a script in the current shell",
+    "alias": "define a command alias",
+    "history": "show previously entered commands",
+    "exit": "leave the shell",
+    "jobs": "list background jobs",
+    "fg": "bring a background job to the foreground",
+    "bg": "resume a job in the background",
+    "type": "show how a name would be interpreted as a command",
+    "set": "set shell options and positional parameters",
+    "read": "read a line from standard input into variables",
+    "test": "evaluate a condition",
+    "[": "evaluate a condition",
+    "true": "do nothing, successfully",
+    "false": "do nothing, unsuccessfully",
+}
+# Programs whose first argument is another command to explain.
+WRAPPERS = {"sudo", "time", "nice", "nohup", "env", "xargs", "watch", "timeout", "exec", "command"}
+CONNECTORS = {
+    "|": "piped into",
+    "|&": "piped (with errors) into",
+    "&&": "then, if it succeeded,",
+    "||": "otherwise, if it failed,",
+    ";": "then",
+    "&": "in the background, then",
+}
+REDIRECTS = {
+    ">": "write output to", ">>": "append output to", "<": "read input from",
+    "2>": "write errors to", "2>>": "append errors to", "&>": "write output and errors to",
+    "2>&1": "send errors to the same place as output",
+}
+
+_OVERSTRIKE = re.compile(r".\x08")
+# An option entry: indented, starts with a dash, the text follows after two
+# or more spaces or on the next (more indented) line.
+_OPTION = re.compile(r"^(?P<indent> +)(?P<flags>-[^\s,]+(?:[ =][^\s,-][^\s,]*)?(?:, *-[^\s,]+(?:[ =][^\s,-][^\s,]*)?)*)(?: {2,}(?P<text>\S.*))?$")
+_FLAG = re.compile(r"-{1,2}[\w?@#][\w-]*")
+
+
+class ManPage(NamedTuple):
+    summary: str
+    options: Dict[str, str]
+
+
+def parse_man_page(text: str) -> ManPage:
+    """Pull the NAME line and the option descriptions out of a rendered man page."""
+    text = _OVERSTRIKE.sub("", text)
+    summary: List[str] = []
+    options: Dict[str, str] = {}
+    section = ""
+    flags: List[str] = []
+    indent = 0
+    description: List[str] = []
+
+    def finish() -> None:
+        if flags and description:
+            text = _first_sentence(" ".join(description))
+            for flag in flags:
+                options.setdefault(flag, text)
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if line and not line[0].isspace():
+            finish()
+            flags, description = [], []
+            section = stripped.upper()
+            continue
+        if section == "NAME":
+            if stripped:
+                summary.append(stripped)
+            continue
+        if section not in ("OPTIONS", "DESCRIPTION", "FLAGS", "COMMAND OPTIONS", "GLOBAL OPTIONS"):
+            continue
+        match = _OPTION.match(line)
+        if match:
+            finish()
+            flags = _FLAG.findall(match.group("flags"))
+            indent = len(match.group("indent"))
+            description = [match.group("text")] if match.group("text") else []
+        elif flags and stripped and len(line) - len(line.lstrip()) > indent:
+            if len(description) < 4:
+                description.append(stripped)
+        elif flags and not stripped and description:
+            finish()
+            flags, description = [], []
+    finish()
+    return ManPage(" ".join(summary), options)
+
+
+def _first_sentence(text: str) -> str:
+    text = " ".join(text.split())
+    match = re.search(r"(?<=[a-z)])\. ", text)
+    return text[:match.start() + 1] if match else text
+
+
+def read_man_page(program: str) -> Optional[ManPage]:
+    """The man page of ``program`` (None if there is none).
+
+    Served from the man page index once it has loaded; ``man`` itself is
+    only run before that, or on systems where no man page sources were found.
+    """
+    if not len(man_index):
+        return _run_man(program)
+    if man_index.get(program) is None:
+        return None
+    options = {flag: _first_sentence(text) for flag, text in man_index.options(program).items()}
+    return ManPage(man_index.summary(program), options)
+
+
+@functools.lru_cache(maxsize=256)
+def _run_man(program: str) -> Optional[ManPage]:
+    try:
+        page = subprocess.run(["man", program], capture_output=True, text=True, timeout=10,
+                              env={**os.environ, "MANWIDTH": "200", "MANPAGER": "cat", "PAGER": "cat"})
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if page.returncode != 0 or not page.stdout.strip():
+        return None
+    return parse_man_page(page.stdout)
+
+
+def describe_program(program: str) -> str:
+    if program in BUILTINS:
+        return BUILTINS[program]
+    page = read_man_page(program)
+    if page is None or not page.summary:
+        return "(no man page found)"
+    # "ls - list directory contents" -> "list directory contents"
+    return re.split(r"\s+[-–—]+\s+", page.summary, maxsplit=1)[-1]
+
+
+def describe_option(program: str, option: str) -> Optional[str]:
+    page = read_man_page(program) if program not in BUILTINS else None
+    if page is None:
+        return None
+    if option in page.options:
+        return page.options[option]
+    if option.startswith("--") and "=" in option:
+        return page.options.get(option.split("=", 1)[0])
+    return None
+
+
+def split_pipeline(command: str) -> List[Tuple[str, List[str]]]:
+    """Split ``command`` into (connector, words) segments; the first connector is ""."""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars="|&;<>")
+    lexer.whitespace_split = True
+    tokens: List[str] = []
+    # Whether each token directly follows the previous one, without whitespace.
+    touching: List[bool] = []
+    try:
+        end = 0
+        for token in lexer:
+            touching.append(end > 0 and not command[end - 1].isspace())
+            tokens.append(token)
+            # How far the lexer read: a token ended by whitespace consumed it,
+            # one ended by punctuation pushed that back.
+            end = lexer.instream.tell() - len(lexer._pushback_chars)
+    except ValueError:  # unbalanced quotes
+        tokens = command.split()
+        touching = [False] * len(tokens)
+    segments: List[Tuple[str, List[str]]] = [("", [])]
+    for token in _join_redirects(tokens, touching):
+        if token in CONNECTORS:
+            segments.append((token, []))
+        else:
+            segments[-1][1].append(token)
+    return [(connector, words) for connector, words in segments if words]
+
+
+def _join_redirects(tokens: List[str], touching: List[bool]) -> List[str]:
+    # The lexer splits "2>&1" into "2", ">&", "1"; "head -n 2 > f" must stay apart.
+    joined: List[str] = []
+    for token, attached in zip(tokens, touching):
+        if joined and attached and token[:1] in "<>" and joined[-1] in ("1", "2"):
+            token = joined.pop() + token
+        elif joined and attached and token in ("1", "2") and joined[-1].endswith(">&"):
+            token = joined.pop() + token
+        joined.append(token)
+    return joined
+
+
+def explain_command(command: str) -> str:
+    """Explain every program, option and argument of ``command`` using local man pages."""
+    lines: List[str] = []
+    for connector, words in split_pipeline(command):
+        lines.extend(_explain_segment(connector, words))
+    return "\n".join(lines) or "(nothing to explain)"
+
+
+def _explain_segment(connector: str, words: List[str]) -> List[str]:
+    lead = f"{CONNECTORS[connector]} " if connector else ""
+    lines: List[str] = []
+    while words and re.match(r"^[A-Za-z_]\w*=", words[0]):
+        lines.append(f"  {words[0]}  set the variable {words[0].split('=', 1)[0]} for this command")
+        words = words[1:]
+    if not words:
+        return lines
+    program, args = words[0], words[1:]
+    name = os.path.basename(program)
+    lines.insert(0, f"{lead}{program} — {describe_program(name)}")
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        index += 1
+        if arg in REDIRECTS:
+            target = args[index] if index < len(args) and not arg.endswith("&1") else ""
+            index += 1 if target else 0
+            lines.append(f"  {(arg + ' ' + target).strip()}  {(REDIRECTS[arg] + ' ' + target).strip()}")
+        elif name in WRAPPERS and not arg.startswith("-"):
+            lines.extend("  " + line for line in _explain_segment("", args[index - 1:]))
+            break
+        elif arg.startswith("-") and arg not in ("-", "--"):
+            lines.extend(f"  {flag}  {text}" for flag, text in _explain_option(name, arg))
+        else:
+            lines.append(f"  {arg}  (argument)")
+    return lines
+
+
+def _explain_option(program: str, arg: str) -> List[Tuple[str, str]]:
+    text = describe_option(program, arg)
+    if text is not None or arg.startswith("--") or len(arg) <= 2:
+        return [(arg, text or "(option)")]
+    # Combined short options: -la is -l and -a.
+    if all(describe_option(program, f"-{c}") for c in arg[1:]):
+        return [(f"-{c}", describe_option(program, f"-{c}")) for c in arg[1:]]
+    return [(arg, "(option)")]
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import random
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from llm_backends import Backend, Completion, LLMError, backend_from_env, estimate_prompt_tokens, estimate_tokens
+from llm_cache import ResponseCache
+from telemetry import CallRecord, Telemetry
+
+DEFAULT_MODEL = os.getenv("TARA_MODEL", "gpt-4o-mini")
+# Seconds an LLM call may take, retries included, before it is abandoned.
+REQUEST_TIMEOUT = float(os.getenv("TARA_LLM_TIMEOUT", "30"))
+# Extra attempts after a rate limit, server error or network failure.
+MAX_RETRIES = int(os.getenv("TARA_LLM_RETRIES", "2"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# Consecutive failed calls after which the API is considered down, and the
+# seconds after which one call is let through again to find out.
+BREAKER_THRESHOLD = int(os.getenv("TARA_LLM_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("TARA_LLM_BREAKER_COOLDOWN", "30"))
+
+Message = Dict[str, str]
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open: recent calls failed, so this one was not sent."""
+
+    def __init__(self, message: str):
+        super().__init__(message, kind="circuit_open")
+
+
+class CircuitBreaker:
+    """Fails fast while the API is down instead of letting every call time out.
+
+    After ``threshold`` consecutive transient failures the breaker opens and
+    calls are refused for ``cooldown`` seconds. Then a single probe call is let
+    through: if it succeeds the breaker closes, otherwise it opens again.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are being refused (or only the probe is let through)."""
+        if self.opened_at is None:
+            return False
+        return self.probing or time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self) -> None:
+        """Raise ``LLMUnavailable`` unless a call may be sent now."""
+        if self.opened_at is None:
+            return
+        if self.is_open:
+            wait = max(self.cooldown - (time.monotonic() - self.opened_at), 0)
+            raise LLMUnavailable(f"The LLM API is unavailable; retrying in {wait:.0f}s")
+        self.probing = True
+
+    def record(self, error: Optional[LLMError]) -> None:
+        if error is None or not error.transient:
+            self.failures, self.opened_at = 0, None
+        else:
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class LLMClient:
+    """Async chat-completions client shared by every LLM call in TARA.
+
+    Requests are answered by ``backend`` (see ``llm_backends``). Rate limits, server errors and network failures are retried with jittered
+    exponential backoff, within the call's overall ``timeout``. A circuit
+    breaker stops sending requests while the API keeps failing.
+
+    Calls made with ``cache=True`` are answered from ``cache`` when the same
+    request was answered before; ``cache_if`` keeps replies the caller cannot
+    use out of it. Identical requests that are in flight at the
+    same time are sent once and share the reply (single-flight); the request
+    is only cancelled once every caller waiting for it has been cancelled.
+
+    Every call is recorded in ``telemetry`` under its ``site`` (which part of
+    TARA made it): latency, tokens, whether the cache answered it, and how it
+    failed.
+    """
+
+    def __init__(self, backend: Optional[Backend] = None, timeout: float = REQUEST_TIMEOUT,
+                 cache: Optional[ResponseCache] = None, retries: int = MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend or backend_from_env()
+        self.timeout = timeout
+        self.cache = cache
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self.telemetry = Telemetry()
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+
+    async def chat(self, messages: List[Message], model: str = DEFAULT_MODEL,
+                   timeout: Optional[float] = None, cache: bool = False,
+                   cache_if: Optional[Callable[[str], bool]] = None, site: str = "other", **params) -> str:
+        """Send a chat completion request and return the reply text."""
+        started = time.monotonic()
+        # Different backends give different answers to the same request.
+        key = ResponseCache.key(f"{self.backend.name}:{model}", messages, **params)
+        use_cache = cache and self.cache is not None
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._record(site, started, None, 0, 0, "hit")
+                return cached
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._request(model, messages, timeout, params))
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda f: self._landed(key, f))
+            lookup = "miss" if use_cache else ""
+        else:
+            self.coalesced += 1
+            lookup = "shared"
+        # Shielded: a caller giving up must not cancel the request for the others.
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            reply: Completion = await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                flight.cancel()
+            self._record(site, started, None, 0, 0, lookup, "cancelled")
+            raise
+        except LLMError as e:
+            self._record(site, started, None, 0, 0, lookup, e.kind)
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+        self._record(site, started, reply.first_byte, reply.prompt_tokens, reply.completion_tokens, lookup)
+        if use_cache and (cache_if is None or cache_if(reply.text)):
+            self.cache.put(key, reply.text)
+        return reply.text
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit breaker is refusing calls; background work should wait."""
+        return not self.breaker.is_open
+
+    async def _request(self, model: str, messages: List[Message], timeout: Optional[float],
+                       params: dict) -> Completion:
+        payload = {"model": model, "messages": messages, **params}
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            try:
+                reply = await self.backend.complete(payload, deadline)
+            except LLMError as e:
+                self.breaker.record(e)
+                attempt += 1
+                await self._backoff(e, attempt, deadline)
+                continue
+            except asyncio.CancelledError:
+                self.breaker.probing = False
+                raise
+            self.breaker.record(None)
+            return reply
+
+    async def _backoff(self, error: LLMError, attempt: int, deadline: float) -> None:
+        """Sleep before retry number ``attempt``, or re-raise ``error`` if it should not be retried."""
+        if not error.transient or attempt > self.retries or self.breaker.is_open:
+            raise error
+        # Full jitter, so clients that failed together do not retry together.
+        if error.retry_after:
+            delay = min(error.retry_after, BACKOFF_MAX)
+        else:
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise error
+        await asyncio.sleep(delay)
+
+    def _landed(self, key: str, flight: asyncio.Future) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved here in case every caller gave up
+
+    def _record(self, site: str, started: float, first_byte: Optional[float], prompt_tokens: int,
+                completion_tokens: int, cache: str = "", error: str = "") -> None:
+        ttfb = max(first_byte - started, 0) if first_byte is not None else None
+        self.telemetry.record(CallRecord(site, ttfb, time.monotonic() - started,
+                                         prompt_tokens, completion_tokens, cache, error))
+
+    async def stream_chat(self, messages: List[Message], model: str = DEFAULT_MODEL,
+                          timeout: Optional[float] = None, site: str = "other", **params) -> AsyncIterator[str]:
+        """Like ``chat``, but yield the reply piece by piece as the API produces it.
+
+        Closing the generator (or cancelling the task consuming it) aborts the
+        request. Streamed replies report no token usage, so it is estimated.
+        """
+        payload = {"model": model, "messages": messages, **params}
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else self.timeout)
+        attempt = 0
+        first_piece: Optional[float] = None
+        received: List[str] = []
+        error = ""
+        try:
+            while True:
+                self.breaker.allow()
+                pieces = self.backend.stream(payload, deadline)
+                try:
+                    async for piece in pieces:
+                        if first_piece is None:
+                            self.breaker.record(None)
+                            first_piece = time.monotonic()
+                        received.append(piece)
+                        yield piece
+                    return
+                except LLMError as e:
+                    if first_piece is not None:
+                        raise  # part of the answer is already out; it cannot be sent again
+                    self.breaker.record(e)
+                    attempt += 1
+                    await self._backoff(e, attempt, deadline)
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.probing = False
+                    raise
+                finally:
+                    await pieces.aclose()
+        except LLMError as e:
+            error = e.kind
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            error = "cancelled"
+            raise
+        finally:
+            self._record(site, started, first_piece, estimate_prompt_tokens(messages),
+                         estimate_tokens("".join(received)), error=error)
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+        if self.cache is not None:
+            self.cache.close()
+
+
+# The client every part of TARA uses.
+llm = LLMClient(cache=ResponseCache())
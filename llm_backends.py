@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+import httpx
+
+# Which backend answers LLM calls: "openai", "http" (any OpenAI-compatible
+# server at TARA_LLM_BASE_URL, e.g. a local model) or "fake" (in-process, no network).
+BACKEND = os.getenv("TARA_LLM_BACKEND", "openai").lower()
+API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+CONNECT_TIMEOUT = 5.0
+# Fake backend: seconds until the first piece of a reply and until the whole
+# reply, and a JSON file of {"regex": "reply"} matched against the last user message.
+FAKE_TTFB = float(os.getenv("TARA_FAKE_TTFB", "0.05"))
+FAKE_LATENCY = float(os.getenv("TARA_FAKE_LATENCY", "0.2"))
+FAKE_RESPONSES = os.getenv("TARA_FAKE_RESPONSES")
+FAKE_DEFAULT_REPLY = "echo 'reply from the fake LLM backend'"
+
+
+class LLMError(Exception):
+    """An LLM request failed: network error, timeout, HTTP error or a malformed reply.
+
+    ``kind`` names the failure for statistics ("timeout", "http_429", ...).
+    ``transient`` failures (rate limits, server errors, timeouts, network
+    errors) are worth retrying; ``retry_after`` is the delay the API asked for.
+    """
+
+    def __init__(self, message: str, transient: bool = False, retry_after: Optional[float] = None,
+                 kind: str = "error"):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+        self.kind = kind
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    # time.monotonic() when the first byte of the reply arrived.
+    first_byte: float
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token for English and shell code."""
+    return max(len(text) // 4, len(text.split()))
+
+
+def estimate_prompt_tokens(messages: List[dict]) -> int:
+    # Plus a few tokens per message for the role and separators.
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+class Backend:
+    """Produces chat completions for ``LLMClient``.
+
+    ``payload`` is an OpenAI-style chat completions request body. ``complete``
+    returns the reply with its token usage, ``stream`` yields its text. Backends
+    raise ``LLMError`` for failures and should give up by ``deadline`` (a
+    ``time.monotonic()`` value); retries, caching and the circuit breaker are
+    up to the client. ``name`` tells the cache apart replies from different
+    backends.
+    """
+
+    name = "backend"
+
+    async def complete(self, payload: dict, deadline: float) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, payload: dict, deadline: float) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HTTPBackend(Backend):
+    """An OpenAI-compatible chat completions endpoint (OpenAI itself by default).
+
+    All requests go through one ``httpx.AsyncClient``, so connections (and
+    their TLS sessions) are pooled and kept alive between calls instead of
+    being set up again each time. The HTTP client is created on first use,
+    inside the running event loop, and dropped again by ``aclose``.
+    """
+
+    def __init__(self, base_url: str = API_BASE, api_key: Optional[str] = None, max_connections: int = 10,
+                 name: Optional[str] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.name = name or base_url
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            api_key = self.api_key if self.api_key is not None else os.getenv("OPENAI_API_KEY")
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60),
+            )
+        return self._http
+
+    async def complete(self, payload: dict, deadline: float) -> Completion:
+        with _api_errors():
+            # httpx's timeouts are per network operation; this bounds the whole request.
+            return await asyncio.wait_for(self._post(payload, deadline), max(deadline - time.monotonic(), 0.1))
+
+    async def _post(self, payload: dict, deadline: float) -> Completion:
+        async with self.http.stream("POST", "/chat/completions", json=payload,
+                                    timeout=_remaining(deadline)) as response:
+            first_byte = time.monotonic()
+            await response.aread()
+        response.raise_for_status()
+        data = response.json()
+        text = data["choices"][0]["message"]["content"].strip()
+        usage = data.get("usage") or {}
+        return Completion(text, usage.get("prompt_tokens") or estimate_prompt_tokens(payload["messages"]),
+                          usage.get("completion_tokens") or estimate_tokens(text), first_byte)
+
+    async def stream(self, payload: dict, deadline: float) -> AsyncIterator[str]:
+        """Closing the generator closes the response, which aborts the request on the server too."""
+        with _api_errors():
+            async with self.http.stream("POST", "/chat/completions", json={**payload, "stream": True},
+                                        timeout=_remaining(deadline)) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Server-sent events: `data: {...}` per delta, `data: [DONE]` at the end.
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    piece = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if piece:
+                        yield piece
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class FakeBackend(Backend):
+    """Answers in-process with canned replies after a configurable delay.
+
+    Replies are picked by the first pattern in ``responses`` found in the
+    last user message, else ``default``. Nothing goes over the network, so the
+    UI can be exercised and timed offline and the results are repeatable.
+    """
+
+    name = "fake"
+
+    def __init__(self, responses: Optional[List[Tuple[str, str]]] = None, default: str = FAKE_DEFAULT_REPLY,
+                 ttfb: float = FAKE_TTFB, latency: float = FAKE_LATENCY):
+        self.responses: List[Tuple[Pattern[str], str]] = [
+            (re.compile(pattern, re.IGNORECASE), reply) for pattern, reply in responses or []
+        ]
+        self.default = default
+        self.ttfb = ttfb
+        self.latency = max(latency, ttfb)
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "FakeBackend":
+        with open(path) as f:
+            return cls(list(json.load(f).items()), **kwargs)
+
+    def reply(self, payload: dict) -> str:
+        prompt = next((m["content"] for m in reversed(payload.get("messages", [])) if m["role"] == "user"), "")
+        for pattern, reply in self.responses:
+            if pattern.search(prompt):
+                return reply
+        return self.default
+
+    async def complete(self, payload: dict, deadline: float) -> Completion:
+        self.calls += 1
+        await self._sleep(self.latency, deadline)
+        text = self.reply(payload)
+        return Completion(text, estimate_prompt_tokens(payload["messages"]), estimate_tokens(text), time.monotonic())
+
+    async def stream(self, payload: dict, deadline: float) -> AsyncIterator[str]:
+        self.calls += 1
+        pieces = re.findall(r"\S+\s*", self.reply(payload)) or [""]
+        await self._sleep(self.ttfb, deadline)
+        gap = (self.latency - self.ttfb) / max(len(pieces) - 1, 1)
+        for i, piece in enumerate(pieces):
+            if i:
+                await self._sleep(gap, deadline)
+            yield piece
+
+    @staticmethod
+    async def _sleep(seconds: float, deadline: float) -> None:
+        if time.monotonic() + seconds > deadline:
+            await asyncio.sleep(max(deadline - time.monotonic(), 0))
+            raise LLMError("The request timed out", transient=True, kind="timeout")
+        await asyncio.sleep(seconds)
+
+
+def backend_from_env() -> Backend:
+    """The backend chosen by ``TARA_LLM_BACKEND``."""
+    if BACKEND == "fake":
+        if FAKE_RESPONSES:
+            return FakeBackend.from_file(FAKE_RESPONSES)
+        return FakeBackend()
+    if BACKEND == "http":
+        base_url = os.getenv("TARA_LLM_BASE_URL", "http://localhost:8000/v1")
+        # Never send the OpenAI key to another server.
+        return HTTPBackend(base_url, api_key=os.getenv("TARA_LLM_API_KEY", ""))
+    if BACKEND != "openai":
+        raise ValueError(f"Unknown TARA_LLM_BACKEND {BACKEND!r}; use openai, http or fake")
+    return HTTPBackend(API_BASE, name="openai")
+
+
+@contextmanager
+def _api_errors() -> Iterator[None]:
+    """Turn transport, HTTP and decoding failures into ``LLMError``."""
+    try:
+        yield
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        raise LLMError(f"HTTP {status}: {_error_message(e.response)}",
+                       transient=status == 429 or status >= 500,
+                       retry_after=_retry_after(e.response), kind=f"http_{status}") from e
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+        raise LLMError("The request timed out", transient=True, kind="timeout") from e
+    except httpx.HTTPError as e:
+        raise LLMError(str(e) or type(e).__name__, transient=True, kind="network") from e
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise LLMError(f"Unexpected response from the API: {e!r}", kind="bad_reply") from e
+
+
+def _remaining(deadline: float) -> httpx.Timeout:
+    left = max(deadline - time.monotonic(), 0.1)
+    return httpx.Timeout(left, connect=min(CONNECT_TIMEOUT, left))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["message"]
+    except Exception:
+        return response.text[:200] or response.reason_phrase
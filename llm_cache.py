@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import time
+from typing import List, Optional
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tara")
+CACHE_PATH = os.getenv("TARA_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite3"))
+# Entries kept on disk; the least recently used ones go first.
+CACHE_MAX_ENTRIES = int(os.getenv("TARA_CACHE_MAX_ENTRIES", "5000"))
+# Seconds an answer stays valid (default one week).
+CACHE_TTL = float(os.getenv("TARA_CACHE_TTL", str(7 * 24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    expires REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def open_database(path: str, schema: str) -> sqlite3.Connection:
+    """Open (creating it if needed) a SQLite database in autocommit/WAL mode."""
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(schema)
+    return db
+
+
+class ResponseCache:
+    """On-disk cache of LLM answers, shared by every TARA session of the user.
+
+    Keys are hashes of the model, the messages (system and user prompt) and
+    the operating system, since commands differ between platforms. Entries
+    expire after their TTL and the cache is trimmed to ``max_entries`` by
+    last use. Any SQLite failure makes the cache act as if it were empty,
+    so a broken or read-only cache file never breaks an LLM call.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._broken = False
+
+    @staticmethod
+    def key(model: str, messages: List[dict], **params) -> str:
+        payload = json.dumps([model, messages, params, platform.system()], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @property
+    def db(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and not self._broken:
+            try:
+                self._db = open_database(self.path, _SCHEMA)
+            except (OSError, sqlite3.Error):
+                self._broken = True
+                self._db = None
+        return self._db
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            row = self.db.execute("SELECT response, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] < now:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self.db.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        except (AttributeError, sqlite3.Error):
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now + (self.ttl if ttl is None else ttl), now),
+            )
+            self.db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except (AttributeError, sqlite3.Error):
+            pass
+
+    def clear(self) -> None:
+        try:
+            self.db.execute("DELETE FROM responses")
+        except (AttributeError, sqlite3.Error):
+            pass
+
+    def __len__(self) -> int:
+        try:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except (AttributeError, sqlite3.Error):
+            return 0
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,328 @@
+import bz2
+import functools
+import gzip
+import json
+import lzma
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from llm_cache import CACHE_DIR, open_database
+
+MAN_INDEX_PATH = os.getenv("TARA_MAN_INDEX_PATH", os.path.join(CACHE_DIR, "man_index.sqlite3"))
+# Man sections with commands in them.
+MAN_SECTIONS = ("1", "8")
+DEFAULT_MAN_PATH = ["/usr/local/share/man", "/usr/share/man", "/usr/local/man", "/usr/man",
+                    "/opt/homebrew/share/man", "/opt/local/share/man"]
+_INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    name TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    path TEXT NOT NULL,
+    options_offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_PAGE_FILE = re.compile(r"^(?P<name>.+)\.(?P<section>[1-9]\w*?)(?:\.(?P<compression>gz|bz2|xz|lzma|Z))?$")
+_OPENERS = {None: open, "gz": gzip.open, "Z": gzip.open, "bz2": bz2.open, "xz": lzma.open, "lzma": lzma.open}
+_ESCAPES = [
+    (re.compile(r"\\f(?:\[[^\]]*\]|\(..|.)"), ""),          # font changes
+    (re.compile(r"\\s[+-]?\d"), ""),                        # size changes
+    (re.compile(r"\\\*(?:\[[^\]]*\]|\(..|.)"), ""),         # strings
+    (re.compile(r"\\\((?:em|en|hy)"), "-"),
+    (re.compile(r"\\\((?:aq|cq|oq)"), "'"),
+    (re.compile(r"\\\((?:lq|rq|dq)"), '"'),
+    (re.compile(r"\\\(.."), ""),
+    (re.compile(r"\\[-]"), "-"),
+    (re.compile(r"\\[ ~0]"), " "),
+    (re.compile(r"\\[&^|%:,/]"), ""),
+    (re.compile(r"\\e"), "\\\\"),
+]
+# Macros whose arguments are printed in alternating fonts, without spaces in between.
+_ALTERNATING = {"BR", "RB", "BI", "IB", "IR", "RI"}
+_FLAG = re.compile(r"(?<![\w-])-{1,2}[\w?@#][\w-]*")
+# Sections (by words in their title) that describe options; e.g. GNU tar has
+# some under DESCRIPTION and the rest under OPTIONS, find's are in EXPRESSION.
+_OPTION_SECTIONS = ("OPTION", "DESCRIPTION", "EXPRESSION", "FLAG")
+
+
+def _describes_options(title: str) -> bool:
+    return any(word in title for word in _OPTION_SECTIONS)
+
+
+class PageEntry(NamedTuple):
+    summary: str
+    path: str
+    options_offset: int
+
+
+def man_path() -> List[str]:
+    """Man page roots, from ``MANPATH`` (an empty entry means the defaults)."""
+    roots = []
+    for root in os.getenv("MANPATH", "").split(":"):
+        for candidate in (DEFAULT_MAN_PATH if not root else [root]):
+            if candidate not in roots and os.path.isdir(candidate):
+                roots.append(candidate)
+    return roots
+
+
+def _signature(roots: List[str]) -> str:
+    # A page being installed or removed changes its section directory's mtime.
+    mtimes = {}
+    for root in roots:
+        for section in MAN_SECTIONS:
+            directory = os.path.join(root, f"man{section}")
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime
+            except OSError:
+                pass
+    return json.dumps([_INDEX_VERSION, mtimes], sort_keys=True)
+
+
+def _page_key(path: str) -> str:
+    # man1/ls.1.gz and man1/ls.1 are the same page.
+    match = _PAGE_FILE.match(os.path.basename(path))
+    return os.path.join(os.path.dirname(path), match.group("name") if match else os.path.basename(path))
+
+
+def _read_source(path: str) -> str:
+    match = _PAGE_FILE.match(os.path.basename(path))
+    with _OPENERS[match.group("compression") if match else None](path, "rb") as f:
+        return f.read().decode("utf-8", errors="replace")
+
+
+def _plain(line: str) -> str:
+    """Roff input line -> plain text (macro name, quotes and escapes removed)."""
+    macro = ""
+    if line.startswith((".", "'")):
+        macro, _, line = line[1:].strip().partition(" ")
+        line = line.strip()
+    if macro:
+        args = re.findall(r'"((?:[^"]|"")*)"|(\S+)', line)
+        words = [quoted.replace('""', '"') or bare for quoted, bare in args]
+        line = ("" if macro in _ALTERNATING else " ").join(words)
+    for pattern, replacement in _ESCAPES:
+        line = pattern.sub(replacement, line)
+    return line.replace("\\\\", "\\").strip()
+
+
+def _sections(source: str) -> List[Tuple[str, int]]:
+    """(section title, offset) of every ``.SH``/``.Sh`` line."""
+    return [(_plain(m.group(2)).upper(), m.start())
+            for m in re.finditer(r"^\.(SH|Sh)\s*(.*)$", source, re.MULTILINE)]
+
+
+def summarize(source: str, name: str) -> Optional[PageEntry]:
+    """The whatis line of a man page source and where its options are described."""
+    sections = _sections(source)
+    titles = [title for title, _ in sections]
+    if "NAME" not in titles:
+        return None
+    start = sections[titles.index("NAME")][1]
+    end = next((offset for _, offset in sections if offset > start), len(source))
+    body = source[start:end].splitlines()[1:]
+    names = [_plain(line) for line in body if line.startswith(".Nm")]
+    descriptions = [_plain(line) for line in body if line.startswith(".Nd")]
+    if descriptions:  # mdoc
+        summary = f"{', '.join(n for n in names if n) or name} - {' '.join(descriptions)}"
+    else:
+        summary = " ".join(_plain(line) for line in body if not line.startswith(('.\\"', "'\\\""))).strip()
+    offset = next((offset for title, offset in sections if _describes_options(title)), -1)
+    return PageEntry(summary, "", offset)
+
+
+def parse_options(source: str) -> Dict[str, str]:
+    """Option -> description from the option sections of ``source``.
+
+    ``source`` starts at the first such section. Understands man (``.TP``/``.IP``
+    tagged paragraphs) and mdoc (``.It Fl``).
+    """
+    options: Dict[str, str] = {}
+    flags: List[str] = []
+    description: List[str] = []
+    tag_next = False
+    active = True
+
+    def finish() -> None:
+        if flags and description:
+            for flag in flags:
+                options.setdefault(flag, " ".join(description))
+
+    for line in source.splitlines():
+        if line.startswith((".SH", ".Sh")):
+            finish()
+            flags, description, tag_next = [], [], False
+            active = _describes_options(_plain(line).upper())
+            continue
+        if not active or line.startswith(('.\\"', "'\\\"")):
+            continue
+        macro = line[1:].split(" ", 1)[0] if line.startswith((".", "'")) else ""
+        if tag_next and macro not in ("PD", "sp"):
+            flags, description, tag_next = _FLAG.findall(_plain(line)), [], False
+            continue
+        if macro in ("TP", "TQ"):
+            if macro == "TP":
+                finish()
+            tag_next = True
+        elif macro in ("IP", "It"):
+            finish()
+            tag = _plain(line)
+            if macro == "It":
+                tag = re.sub(r"\bFl\s+", "-", tag)
+            flags, description = _FLAG.findall(tag), []
+        elif macro in ("PP", "P", "LP", "SS", "Ss", "Bl", "El", "RE", "RS"):
+            finish()
+            if macro not in ("RS", "Bl"):
+                flags, description = [], []
+        elif flags and len(description) < 6:
+            text = _plain(line)
+            if text:
+                description.append(text)
+    finish()
+    return options
+
+
+class ManIndex:
+    """What ``whatis`` would say about every command, without running ``man``.
+
+    The index maps command names to their NAME line, the page's source file
+    and the offset of its first section describing options. It is built from
+    the man page sources themselves, stored in SQLite next to the LLM cache
+    and rebuilt when a man section directory changes. ``refresh`` brings the
+    whole index into memory, so lookups are dictionary hits; options are
+    parsed from the source on first use.
+    """
+
+    def __init__(self, path: str = MAN_INDEX_PATH, roots: Optional[List[str]] = None):
+        self.path = path
+        self.roots = roots
+        self._pages: Optional[Dict[str, PageEntry]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._pages is not None
+
+    def refresh_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.refresh, name="man-index", daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self) -> None:
+        """Load the index from disk, rebuilding it first if it is missing or stale."""
+        with self._lock:
+            roots = self.roots if self.roots is not None else man_path()
+            signature = _signature(roots)
+            try:
+                db = open_database(self.path, _SCHEMA)
+            except (OSError, sqlite3.Error):
+                db = None
+            try:
+                pages = self._load(db, signature)
+                if pages is None:
+                    pages = self._build(roots)
+                    self._store(db, signature, pages)
+                self._pages = pages
+                self.options.cache_clear()
+            finally:
+                if db is not None:
+                    db.close()
+
+    @staticmethod
+    def _load(db: Optional[sqlite3.Connection], signature: str) -> Optional[Dict[str, PageEntry]]:
+        if db is None:
+            return None
+        try:
+            row = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            if row is None or row[0] != signature:
+                return None
+            return {name: PageEntry(*rest) for name, *rest in
+                    db.execute("SELECT name, summary, path, options_offset FROM pages")}
+        except sqlite3.Error:
+            return None
+
+    @staticmethod
+    def _build(roots: List[str]) -> Dict[str, PageEntry]:
+        pages: Dict[str, PageEntry] = {}
+        aliases: Dict[str, str] = {}
+        for root in roots:
+            for section in MAN_SECTIONS:
+                directory = os.path.join(root, f"man{section}")
+                try:
+                    files = sorted(os.listdir(directory))
+                except OSError:
+                    continue
+                for filename in files:
+                    match = _PAGE_FILE.match(filename)
+                    if not match or match.group("name") in pages or match.group("name") in aliases:
+                        continue
+                    name, path = match.group("name"), os.path.join(directory, filename)
+                    try:
+                        source = _read_source(path)
+                    except (OSError, EOFError, lzma.LZMAError):
+                        continue
+                    link = re.match(r"\.so\s+(\S+)", source)
+                    if link:
+                        aliases[name] = os.path.join(root, link.group(1))
+                        continue
+                    entry = summarize(source, name)
+                    if entry is not None:
+                        pages[name] = entry._replace(path=path)
+        by_path = {_page_key(entry.path): entry for entry in pages.values()}
+        for name, target in aliases.items():
+            entry = by_path.get(_page_key(target))
+            if entry is not None:
+                pages[name] = entry
+        # "grep, egrep, fgrep - ..." also describes egrep and fgrep.
+        for entry in list(pages.values()):
+            for other in entry.summary.split(" - ", 1)[0].split(","):
+                pages.setdefault(other.strip(), entry)
+        pages.pop("", None)
+        return pages
+
+    @staticmethod
+    def _store(db: Optional[sqlite3.Connection], signature: str, pages: Dict[str, PageEntry]) -> None:
+        if db is None:
+            return
+        try:
+            db.execute("BEGIN")
+            db.execute("DELETE FROM pages")
+            db.executemany("INSERT INTO pages (name, summary, path, options_offset) VALUES (?, ?, ?, ?)",
+                           [(name, *entry) for name, entry in pages.items()])
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+
+    def __len__(self) -> int:
+        return len(self._pages) if self._pages is not None else 0
+
+    def get(self, name: str) -> Optional[PageEntry]:
+        return self._pages.get(name) if self._pages is not None else None
+
+    def summary(self, name: str) -> Optional[str]:
+        entry = self.get(name)
+        return entry.summary if entry else None
+
+    @functools.lru_cache(maxsize=256)
+    def options(self, name: str) -> Dict[str, str]:
+        entry = self.get(name)
+        if entry is None or entry.options_offset < 0:
+            return {}
+        try:
+            return parse_options(_read_source(entry.path)[entry.options_offset:])
+        except (OSError, EOFError, lzma.LZMAError):
+            return {}
+
+
+# The index every part of TARA uses; the apps refresh it in the background on start.
+man_index = ManIndex()
@@ -0,0 +1,113 @@
+import os
+from typing import Iterable, List, Optional, Union
+
+from rich.ansi import AnsiDecoder
+from rich.text import Text
+from textual.cache import LRUCache
+from textual.geometry import Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+# Lines the output view keeps; older ones scroll off the top.
+MAX_LINES = int(os.getenv("TARA_OUTPUT_LINES", "5000"))
+
+
+class OutputView(ScrollView, can_focus=True):
+    """Scrollable command output that only renders the lines in view.
+
+    Content is kept as a list of Rich ``Text`` lines. Lines are never wrapped
+    (long ones scroll horizontally), so appending only has to measure the new
+    lines and a resize does not re-lay-out the whole buffer. Visible lines
+    are rendered on demand and cached.
+    """
+
+    def __init__(self, content: Union[str, Text] = "", title: str = "", border_style: str = "magenta",
+                 max_lines: int = MAX_LINES, id: Union[str, None] = None):
+        super().__init__(id=id)
+        self.max_lines = max_lines
+        self._lines: List[Text] = []
+        self._partial: List[Text] = []
+        self._width = 0
+        self._cache: LRUCache[int, Strip] = LRUCache(1024)
+        self._initial = (content, title, border_style)
+        # The streamer filling the view with a running command's output, if any.
+        self.writer: Optional[object] = None
+
+    def on_mount(self) -> None:
+        super().on_mount()
+        self.show(*self._initial)
+
+    @property
+    def line_count(self) -> int:
+        return len(self._lines) + len(self._partial)
+
+    def show(self, content: Union[str, Text], title: str = "", border_style: str = "magenta") -> None:
+        """Replace everything with ``content`` (ANSI escapes are decoded)."""
+        self.clear(title, border_style)
+        if isinstance(content, Text):
+            lines = content.split("\n", allow_blank=True)
+        else:
+            lines = AnsiDecoder().decode(content)
+        self.write_lines(lines)
+        self.scroll_home(animate=False, immediate=True)
+
+    def clear(self, title: str = "", border_style: str = "magenta") -> None:
+        self._lines.clear()
+        self._partial.clear()
+        self._width = 0
+        self._cache.clear()
+        self.border_title = Text(title)
+        self.border_subtitle = ""
+        self.styles.border = ("solid", border_style)
+        self.virtual_size = Size(0, 0)
+        self.refresh()
+
+    def write_lines(self, lines: Iterable[Text]) -> None:
+        """Append complete lines; only the new lines are measured."""
+        at_end = self.is_vertical_scroll_end
+        start = len(self._lines)
+        for line in lines:
+            line.expand_tabs()
+            self._width = max(self._width, line.cell_len)
+            self._lines.append(line)
+        if len(self._lines) > self.max_lines * 1.25:
+            # Prune in batches so appends stay cheap on average.
+            del self._lines[:len(self._lines) - self.max_lines]
+            self._cache.clear()
+            start = 0
+        self._update(start, at_end)
+
+    def set_partial(self, lines: List[Text]) -> None:
+        """Show not-yet-finished lines after the complete ones, replacing the previous ones."""
+        at_end = self.is_vertical_scroll_end
+        self._partial = lines
+        for line in lines:
+            self._width = max(self._width, line.cell_len)
+        self._update(len(self._lines), at_end)
+
+    def _update(self, first_changed: int, scroll_end: bool) -> None:
+        for y in list(self._cache.keys()):
+            if y >= first_changed:
+                self._cache.discard(y)
+        self.virtual_size = Size(self._width, self.line_count)
+        if scroll_end:
+            self.scroll_end(animate=False, immediate=True, x_axis=False)
+        self.refresh()
+
+    def notify_style_update(self) -> None:
+        super().notify_style_update()
+        self._cache.clear()
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        rich_style = self.rich_style
+        if index >= self.line_count:
+            return Strip.blank(width, rich_style)
+        strip = self._cache.get(index)
+        if strip is None:
+            line = self._lines[index] if index < len(self._lines) else self._partial[index - len(self._lines)]
+            strip = Strip(line.render(self.app.console), line.cell_len)
+            self._cache[index] = strip
+        return strip.crop_extend(scroll_x, scroll_x + width, rich_style)
@@ -1,34 +1,55 @@
 import os
-import subprocess
-import openai
 from dotenv import load_dotenv
 import asyncio
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 import pyfiglet
 from time import sleep
 from datetime import datetime
 from rich.panel import Panel as RichPanel
 from rich.text import Text
+from textual import constants, work
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.widgets import Static, Input, Header, Footer, Markdown
 from textual.scroll_view import ScrollView
 from textual.screen import Screen
 from textual.binding import Binding
-from typing import Union, List
+from textual.timer import Timer
+from textual.worker import Worker
+from typing import Optional, Union, List, Tuple
 from rich.panel import Panel
 from rich.console import Console
 import platform
+import time
+from ansi import IncrementalAnsiDecoder
+from assist import COMBINED_NL, Assistance, assist
+from chat_context import ChatContext
+from output_view import OutputView
+from explain import explain_command
+from executor import (USE_PTY, CommandResult, Job, JobTable, OutputChunk, ShellSession, keep_output_in,
+                      merge_chunks, remove_spill_files)
+from llm import llm
+from man_index import man_index
+from telemetry import CallRecord
+from translate import TranslationIndex, translate_offline
+
+# Seconds of no typing after which DevTARA asks for suggestions.
+SUGGEST_DEBOUNCE = float(os.getenv("TARA_SUGGEST_DEBOUNCE", "0.6"))
+# Translate `nl:` input in the background while it is being typed (see the `speculate` builtin).
+SPECULATIVE_NL = os.getenv("TARA_SPECULATIVE_NL", "0").lower() in ("1", "true", "yes", "on")
+# Seconds of no typing after which StudentTARA starts translating `nl:` input.
+SPECULATE_DEBOUNCE = float(os.getenv("TARA_SPECULATE_DEBOUNCE", "0.6"))
 class ChatScreen(Screen):
     BINDINGS = [
-        Binding("escape", "request_close", "Exit Chat", show=True),
+        Binding("escape", "request_close", "Stop answer / Exit Chat", show=True),
     ]
 
     def __init__(self):
         super().__init__()
         self.chat_history = []
+        self.context = ChatContext("You're a helpful terminal tutor.")
+        self.answering: Optional[Worker] = None
 
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
@@ -39,6 +60,10 @@ class ChatScreen(Screen):
         yield Footer()
 
     async def action_request_close(self) -> None:
+        if self.answering is not None and self.answering.is_running:
+            # Escape while STEPH is answering only stops the answer.
+            self.answering.cancel()
+            return
         await self.app.pop_screen()
         try:
             self.app.query_one("#prompt_input", Input).focus()
@@ -64,95 +89,232 @@ class ChatScreen(Screen):
             return
 
         self.chat_history.append({"role": "user", "content": user_msg})
-        self.output_md.update("**STEPH:** Thinking…")
-
-        import openai
+        self.show_conversation("")
+        self.answering = self.answer(self.context.build(self.chat_history), len(self.chat_history))
+
+    def show_conversation(self, pending: Optional[str] = None) -> None:
+        """Render the chat so far, plus the answer still being streamed if there is one."""
+        parts = [
+            f"**You:** {m['content']}" if m['role'] == "user" else f"**STEPH:** {m['content']}"
+            for m in self.chat_history
+        ]
+        if pending is not None:
+            parts.append(f"**STEPH:** {pending or 'Thinking…'}")
+        self.output_md.update("\n\n".join(parts))
+        self.output.scroll_end(animate=False)
+
+    @work(group="chat", exclusive=True)
+    async def answer(self, messages: List[dict], position: int) -> None:
+        """Stream the reply to ``messages`` into the chat; it goes at ``position`` in the history."""
+        reply = ""
+        last_render = 0.0
         try:
-            messages = [{"role": "system", "content": "You're a helpful terminal tutor."}] + self.chat_history[-8:]
-            completion = await asyncio.to_thread(lambda: openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=messages
-            ))
-            reply = completion.choices[0].message.content.strip()
-            self.chat_history.append({"role": "assistant", "content": reply})
-            conversation_md = "\n\n".join([
-                f"**You:** {m['content']}" if m['role'] == "user" else f"**STEPH:** {m['content']}"
-                for m in self.chat_history
-            ])
-            self.output_md.update(conversation_md)
-            self.output.scroll_end(animate=False)
+            async for piece in llm.stream_chat(messages, site="chat"):
+                reply += piece
+                # Re-render at most once per frame, however fast tokens arrive.
+                now = time.monotonic()
+                if now - last_render >= 1 / constants.MAX_FPS:
+                    last_render = now
+                    self.show_conversation(reply)
+        except asyncio.CancelledError:
+            # Keep the partial answer after its own question, even if a newer one was asked.
+            if reply and position >= self.context.summarized:
+                self.chat_history.insert(position, {"role": "assistant", "content": reply.strip()})
+                self.compact_context()
+            self.show_conversation()
+            raise
         except Exception as e:
             self.output_md.update(f"**Error:** {e}")
+            return
+        self.chat_history.append({"role": "assistant", "content": reply.strip()})
+        self.show_conversation()
+        self.compact_context()
+
+    @work(group="chat_summary")
+    async def compact_context(self) -> None:
+        await self.context.compact(self.chat_history)
 
-def get_gpt_explanation(command_text: str) -> str:
+async def get_gpt_explanation(command_text: str) -> str:
     if not command_text.strip():
         return "No command was entered to explain."
     try:
-        completion = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that explains bash commands in one short sentence."},
-                {"role": "user", "content": f"Explain this bash command in one sentence:\n{command_text}"}
-            ]
-        )
-        return completion.choices[0].message.content.strip()
+        return await llm.chat([
+            {"role": "system", "content": "You are a helpful assistant that explains bash commands in one short sentence."},
+            {"role": "user", "content": f"Explain this bash command in one sentence:\n{command_text}"}
+        ], cache=True, site="explain")
     except Exception as e:
         return f"Error getting explanation: {e}"
 
-def get_man_summary(command):
+async def run_command(session: ShellSession, command: str, on_chunk=None, pty: bool = False,
+                      columns: int = 80, on_start=None) -> CommandResult:
+    if not command.strip():
+        return CommandResult(command, message="(No command to execute)")
     try:
-        one_liner = subprocess.run(
-            ["man", "-f", command], capture_output=True, text=True
-        )
-        if one_liner.returncode == 0 and " - " in one_liner.stdout:
-            return one_liner.stdout.strip()
-
-        full_page = subprocess.run(["man", command], capture_output=True, text=True)
-        if full_page.returncode != 0:
-            return f"(No man page entry found for {command})"
-
-        lines = full_page.stdout.splitlines()
-        grabbing = False
-        name_lines = []
-        for ln in lines:
-            if ln.strip() == "NAME":
-                grabbing = True
-                continue
-            if grabbing:
-                if ln.strip() == "" or ln.strip().isupper():
-                    break
-                name_lines.append(ln.strip())
-        summary = " ".join(name_lines).strip()
-        return summary or f"(NAME section missing for {command})"
-    except FileNotFoundError:
-        return "(The 'man' command is not available.)"
+        result = await session.run(command, on_chunk, pty=pty, columns=columns, on_start=on_start)
+        if session.cwd != os.getcwd():
+            # Keep TARA's own cwd (tab completion, logs) in step with the shell.
+            os.chdir(session.cwd)
+            if not result.stdout.total_bytes and not result.stderr.total_bytes:
+                result.message = f"Changed directory to {session.cwd}"
+        return result
     except Exception as e:
-        return f"Error reading man page: {e}"
-
+        return CommandResult(command, message=f"Error executing command: {e}")
+
+def result_title(title: str, result: Optional[CommandResult]) -> str:
+    return f"{title} ({result.usage.summary()})" if result and result.usage else title
+
+def describe_full_output(result: Optional[CommandResult]) -> str:
+    if result is None or not result.truncated:
+        return "The last command's output was shown in full."
+    return "Full output of the last command:\n" + "\n".join(
+        f"{c.stream}: {c.spill_path} ({c.total_bytes:,} bytes, {c.line_count:,} lines)"
+        for c in result.captures if c.truncated
+    )
+
+def describe_llm_stats() -> str:
+    breaker = "open (calls paused)" if llm.breaker.is_open else "closed"
+    return (f"{llm.telemetry.report()}\n\n"
+            f"Identical in-flight calls shared: {llm.coalesced}. Circuit breaker: {breaker}.")
+
+class OutputStreamer:
+    """Feeds a running command's output into an ``OutputView`` as it arrives.
+
+    Output is decoded from ANSI into Rich lines (one decoder per stream).
+    Completed lines are appended straight away; the unfinished last line of
+    each stream is refreshed at most every ``interval`` seconds.
+
+    The view is only cleared by ``start``, once the command runs, and only the
+    streamer that started last writes to it, so a command finishing late
+    cannot overwrite the output of the one after it.
+    """
 
-def run_command(command: str) -> str:
-    if not command.strip():
-        return "(No command to execute)"
-    if command.startswith("cd "):
+    def __init__(self, view: OutputView, title: str, border_style: str, interval: float = 0.1):
+        self.view = view
+        self.title = title
+        self.border_style = border_style
+        self.interval = interval
+        self._decoders = {"stdout": IncrementalAnsiDecoder(), "stderr": IncrementalAnsiDecoder("red")}
+        self._last_flush = 0.0
+
+    def start(self) -> None:
+        self.view.clear(self.title, self.border_style)
+        self.view.writer = self
+
+    def finish(self, content: Union[str, Text], title: str) -> None:
+        """Replace the streamed output with the final ``content``, unless a newer command owns the view."""
+        if self.view.writer in (self, None):
+            self.view.writer = None
+            self.view.show(content, title=title, border_style=self.border_style)
+
+    def __call__(self, chunk: OutputChunk) -> None:
+        if self.view.writer is not self:
+            return
+        lines = self._decoders[chunk.stream].feed(chunk.text, self.view.max_lines)
+        if lines:
+            self.view.write_lines(lines)
+        now = time.monotonic()
+        if lines or now - self._last_flush >= self.interval:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self) -> None:
+        if self.view.writer is self:
+            self.view.set_partial([d.preview() for d in self._decoders.values() if d.partial])
+
+def split_background(cmd: str) -> Optional[str]:
+    """Return ``cmd`` without its trailing ``&`` if it asks to run as a background job."""
+    if cmd.endswith("&") and not cmd.endswith("&&") and not cmd.endswith("\\&"):
+        return cmd[:-1].strip() or None
+    return None
+
+class JobControl:
+    """`cmd &`, `jobs`, `fg` and `kill %N` for the TARA apps.
+
+    Apps set OUTPUT_ID / OUTPUT_TITLE / INPUT_ID to point at their own widgets.
+    """
+    OUTPUT_ID = ""
+    OUTPUT_TITLE = ""
+    INPUT_ID = ""
+    fg_job: Optional[Job] = None
+
+    def handle_job_builtin(self, cmd: str) -> bool:
+        output = self.query_one(self.OUTPUT_ID, OutputView)
+        background = split_background(cmd)
+        if background:
+            job = self.jobs.start(background, self.shell_session.cwd, on_done=self._job_done,
+                                  argv=self.shell_session.job_argv(background))
+            output.show(f"[{job.id}] started: {job.command}\n\nUse `jobs`, `fg %{job.id}` or `kill %{job.id}`.",
+                        title="Jobs", border_style="cyan")
+        elif cmd == "jobs":
+            output.show(self.jobs.describe(), title="Jobs", border_style="cyan")
+        elif cmd == "fg" or cmd.startswith("fg "):
+            job = self.jobs.get(cmd[2:])
+            if job is None:
+                output.show(f"fg: no such job: {cmd[2:].strip() or '(none)'}", title="Jobs", border_style="red")
+            else:
+                self.foreground_job(job)
+        elif cmd.startswith("kill %"):
+            job = self.jobs.get(cmd[5:])
+            if job is None or not job.running:
+                output.show(f"kill: no running job: {cmd[5:].strip()}", title="Jobs", border_style="red")
+            else:
+                job.interrupted = "killed"
+                job.kill()
+                output.show(f"[{job.id}] terminated: {job.command}", title="Jobs", border_style="cyan")
+        else:
+            return False
+        self.query_one(self.INPUT_ID, Input).focus()
+        return True
+
+    @work(group="jobs")
+    async def foreground_job(self, job: Job) -> None:
+        output = self.query_one(self.OUTPUT_ID, OutputView)
+        title = f"[{job.id}] {job.command}"
+        streamer = OutputStreamer(output, title, "magenta")
+        streamer.start()
+        for chunk in merge_chunks(job.stdout, job.stderr):
+            streamer(chunk)
+        streamer.flush()
+        job.listeners.append(streamer)
+        self.fg_job = job
         try:
-            path = command[3:].strip()
-            os.chdir(path)
-            return f"Changed directory to {os.getcwd()}"
-        except Exception as e:
-            return f"Error changing directory: {e}"
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=False)
-        output_parts = []
-        if result.stdout:
-            output_parts.append(f"Stdout:\n{result.stdout.strip()}")
-        if result.stderr:
-            output_parts.append(f"Stderr:\n{result.stderr.strip()}")
-
-        if not output_parts:
-            return "(Command produced no output)"
-        return "\n\n".join(output_parts)
-    except Exception as e:
-        return f"Error executing command: {e}"
+            # Shielded so that leaving the view never kills the job itself.
+            await asyncio.shield(job.task)
+        finally:
+            job.listeners.remove(streamer)
+            if self.fg_job is job:
+                self.fg_job = None
+        self.last_result = job.result
+        streamer.finish(self.last_result.text(), result_title(f"{title} ({job.status})", self.last_result))
+
+    def output_columns(self) -> int:
+        """Width available to command output inside the output panel."""
+        return max(20, self.query_one(self.OUTPUT_ID, OutputView).scrollable_content_region.width)
+
+    def action_cancel_command(self) -> None:
+        """Ctrl+C: interrupt the job shown with `fg`, or else the running shell command."""
+        if self.fg_job is not None and self.fg_job.running:
+            self.run_worker(self.fg_job.interrupt(), group="cancel")
+        elif self.shell_session.busy:
+            self.run_worker(self.shell_session.interrupt(), group="cancel")
+        else:
+            self.notify("No command is running.", timeout=2)
+
+    def show_waiting(self) -> None:
+        # The running command's output stays in view; the next one takes over once it starts.
+        if self.shell_session.busy:
+            self.query_one(self.OUTPUT_ID, OutputView).border_subtitle = "next command waiting"
+            self.notify("Waiting for the previous command to finish... "
+                        "(end a command with `&` to run it in the background)", timeout=4)
+
+    def _job_done(self, job: Job) -> None:
+        self.notify(f"[{job.id}] {job.status}: {job.command}", title="Job finished")
+        self.user.add_history_and_log({
+            "timestamp": datetime.now(),
+            "command": f"{job.command} &",
+            "explanation": "",
+            "result": job.result
+        })
 
 class HistoryScreen(Screen):
     BINDINGS = [
@@ -181,14 +343,16 @@ class HistoryScreen(Screen):
             ts = entry["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
             cmd = entry.get("command", "")
             explanation = entry.get("explanation", "N/A")
-            output = entry.get("output", "N/A")
+            result = entry.get("result")
+            output = result.text() if result else "N/A"
 
             blocks.append(
                 f"### {ts}\n"
                 f"**Command:** `{cmd}`\n\n"
                 f"**Explanation:**\n```text\n{explanation}\n```\n"
                 f"**Output:**\n```text\n{output}\n```\n"
-                "---"
+                + (f"**Usage:** {result.usage.summary()}\n\n" if result and result.usage else "")
+                + "---"
             )
 
         return "# Command History\n\n" + "\n\n".join(blocks)
@@ -203,7 +367,14 @@ class HistoryScreen(Screen):
     async def action_request_close(self) -> None:
         await self.app.pop_screen()
 
-class StudentTARA(App):
+class StudentTARA(JobControl, App):
+    OUTPUT_ID = "#output"
+    OUTPUT_TITLE = "Output / Dry Run"
+    INPUT_ID = "#prompt_input"
+    BINDINGS = [
+        Binding("ctrl+c", "cancel_command", "Cancel command", show=True, priority=True),
+    ]
+
     CSS = """
 Screen {
   layout: vertical;
@@ -288,9 +459,30 @@ Screen {
     def __init__(self, user):
         super().__init__()
         self.user = user
+        self.shell_session = ShellSession()
+        self.last_result: Optional[CommandResult] = None
+        self.jobs = JobTable()
+        self.use_pty = USE_PTY
+        self.translations = TranslationIndex()
+        self.speculate = SPECULATIVE_NL
+        # Last command shown in the explanation panel (what `explain` asks about).
+        self.explained_command = ""
+        self.speculate_timer: Optional[Timer] = None
+        # (exact input text, translate_nl task) of the last speculative nl: translation.
+        self.speculation: Optional[Tuple[str, asyncio.Future]] = None
 
     def on_mount(self) -> None:
         self.query_one("#prompt_input", Input).focus()
+        man_index.refresh_in_background()
+        llm.telemetry.listeners.append(self.user.log_llm_call)
+
+    async def on_unmount(self) -> None:
+        self.jobs.kill_all()
+        await self.shell_session.close()
+        remove_spill_files()
+        llm.telemetry.listeners.remove(self.user.log_llm_call)
+        self.user.log_llm_stats(describe_llm_stats())
+        await llm.aclose()
 
     def compose(self) -> ComposeResult:
         fig = pyfiglet.Figlet(font="small")
@@ -315,11 +507,7 @@ Screen {
                                expand=True, id="explanation_content"),
                         id="explanation"
                     )
-                yield ScrollView(
-                    Static(Panel("(no output yet)", title="Output / Dry Run",
-                                 border_style="magenta"), expand=True, id="output_content"),
-                    id="output"
-                )
+                yield OutputView("(no output yet)", title="Output / Dry Run", id="output")
 
             suggestion_scroll = ScrollView(id="suggestion_scroll")
             yield suggestion_scroll
@@ -332,6 +520,8 @@ Screen {
 
     async def on_input_submitted(self, event: Input.Submitted) -> None:
         cmd = event.value.strip()
+        # Before the input is cleared, which would discard it.
+        speculation = self.take_speculation(cmd)
         self.query_one("#prompt_input", Input).value = ""
 
         if cmd.lower() == "quit":
@@ -340,23 +530,10 @@ Screen {
         elif cmd.lower() == "chat":
             await self.app.push_screen(ChatScreen())
             return
-        if cmd.startswith("cd "):
-            try:
-                path = cmd[3:].strip()
-                os.chdir(path)
-                self.query_one("#output_content", Static).update(
-                    Panel(f"Changed directory to {os.getcwd()}", title="Output / Dry Run", border_style="magenta")
-                )
-                return
-            except Exception as e:
-                self.query_one("#output_content", Static).update(
-                    Panel(f"Error changing directory: {e}", title="Output / Dry Run", border_style="red")
-                )
-                return
         elif cmd.lower().startswith("room:"):
             room_name = cmd[5:].strip()
-            self.query_one("#output_content", Static).update(
-                Panel(f"Switched to room: {room_name}", title="Output / Dry Run", border_style="cyan")
+            self.query_one("#output", OutputView).show(
+                f"Switched to room: {room_name}", title="Output / Dry Run", border_style="cyan"
             )
             self.query_one("#prompt_input", Input).focus()
             return
@@ -367,106 +544,208 @@ Screen {
 
             - `nl: [description]` — Translate natural language to terminal command
             - `vfo` or `Ctrl+H` — Show log‑file location (full session output).
+            - `full` — Show where the untruncated output of the last command is stored
+            - `explain` — Ask for a fuller explanation of the last command
+            - `stats` — Show latency, token and cache statistics of LLM calls
+            - `[command] &` — Run a command in the background; `jobs`, `fg %N` and `kill %N` manage it
+            - `Ctrl+C` — Interrupt the running command (set `TARA_COMMAND_TIMEOUT` for a time limit)
+            - `pty on` / `pty off` — Run commands on a pseudo-terminal so colours and progress output work
+            - `speculate on` / `speculate off` — Start translating `nl:` input while you are still typing
             - `chat` — Open chat mode for tutoring
             - `quit` — Exit the program
             - `[any valid command]` — Run that command and show explanation/output
             """
-            self.query_one("#output_content", Static).update(
-                Panel(help_text.strip(), title="Help", border_style="cyan")
+            self.query_one("#output", OutputView).show(
+                help_text.strip(), title="Help", border_style="cyan"
             )
             self.query_one("#prompt_input", Input).focus()
             return
 
         if cmd.lower() == "vfo":
-            self.query_one("#output_content", Static).update(
-                Panel(f"Full session log saved at:\n{self.user.log_file_path}",
-                      title="Log Location", border_style="cyan")
+            self.query_one("#output", OutputView).show(
+                f"Full session log saved at:\n{self.user.log_file_path}",
+                title="Log Location", border_style="cyan"
             )
             self.query_one("#prompt_input", Input).focus()
             return
 
+        if cmd.lower() in ("pty", "pty on", "pty off"):
+            if cmd.lower() != "pty":
+                self.use_pty = cmd.lower() == "pty on"
+            self.query_one("#output", OutputView).show(
+                f"PTY mode is {'on' if self.use_pty else 'off'}.", title="Output / Dry Run", border_style="cyan"
+            )
+            self.query_one("#prompt_input", Input).focus()
+            return
+
+        if cmd.lower() in ("speculate", "speculate on", "speculate off"):
+            if cmd.lower() != "speculate":
+                self.speculate = cmd.lower() == "speculate on"
+            self.query_one("#output", OutputView).show(
+                f"Speculative nl: translation is {'on' if self.speculate else 'off'}.",
+                title="Output / Dry Run", border_style="cyan"
+            )
+            self.query_one("#prompt_input", Input).focus()
+            return
+
+        if cmd.lower() == "full":
+            self.query_one("#output", OutputView).show(
+                describe_full_output(self.last_result), title="Full Output", border_style="cyan"
+            )
+            self.query_one("#prompt_input", Input).focus()
+            return
+
+        if cmd.lower() == "stats":
+            self.query_one("#output", OutputView).show(
+                describe_llm_stats(), title="LLM Stats", border_style="cyan"
+            )
+            self.query_one("#prompt_input", Input).focus()
+            return
+
+        if cmd.lower() in ("explain", "more"):
+            self.explain_more()
+            self.query_one("#prompt_input", Input).focus()
+            return
+
+        if self.handle_job_builtin(cmd):
+            return
+
+        self.process_command(cmd, speculation)
+
+    @work(group="command")
+    async def process_command(self, cmd: str, speculation: Optional[asyncio.Future] = None) -> None:
         self.query_one("#command_content", Static).update(
             Panel(f"> {cmd if cmd else 'No command entered'}", title="Command", border_style="green")
         )
 
-        explanation_text = "N/A"
-        output_text = "(no command to run)"
-        translated_command = ""
-        raw_command = cmd
+        if not cmd:
+            self.query_one("#explanation_content", Static).update(
+                Panel("Please enter a command to get an explanation.", title="Explanation", border_style="blue")
+            )
+            self.query_one("#output", OutputView).show(
+                "(no command to run)", title="Output / Dry Run", border_style="magenta"
+            )
+            self.query_one("#prompt_input", Input).focus()
+            await self.show_suggestions("")
+            return
 
-        if cmd:
-            if cmd.startswith("nl:"):
-                self.query_one("#explanation_content", Static).update(
-                    Panel("Translating natural language to bash command...", title="Explanation", border_style="blue")
-                )
-                nl_query = cmd[3:].strip()
-                bash_cmd = self.convert_nl_to_bash(nl_query)
-                translated_command = bash_cmd
-                self.query_one("#command_content", Static).update(
-                    Panel(f"Natural language: {cmd}\n\nBash: {bash_cmd}", title="Command", border_style="green")
-                )
-                explanation_text = get_gpt_explanation(bash_cmd)
-                self.query_one("#explanation_content", Static).update(
-                    Panel(explanation_text, title="Explanation", border_style="blue")
-                )
-                output_text = run_command(bash_cmd)
-                self.query_one("#output_content", Static).update(
-                    Panel(output_text, title="Output / Dry Run", border_style="magenta")
-                )
-                history_entry = {
-                    "timestamp": datetime.now(),
-                    "command": raw_command,
-                    "translated_command": bash_cmd,
-                    "explanation": explanation_text,
-                    "output": output_text
-                }
-                self.user.add_history_and_log(history_entry)
+        translated_command = cmd
+        if cmd.startswith("nl:"):
+            self.query_one("#explanation_content", Static).update(
+                Panel("Translating natural language to bash command...", title="Explanation", border_style="blue")
+            )
+            nl_query = cmd[3:].strip()
+            assistance: Optional[Assistance] = None
+            offline = translate_offline(nl_query)
+            match = self.translations.lookup(nl_query) if offline is None else None
+            if speculation is not None and (offline is not None or match):
+                speculation.cancel()
+            if offline is not None:
+                translated_command = offline
+                source = "\n\n(translated offline by a built-in rule)"
+            elif match:
+                translated_command = match.command
+                source = f"\n\n(cached: reused the translation of \"{match.query}\")"
+            elif speculation is not None:
+                translated_command, assistance = await speculation
+                source = ""
             else:
-                translated_command = cmd
-                self.query_one("#explanation_content", Static).update(
-                    Panel(f"Fetching explanation for: '{cmd}'...", title="Explanation", border_style="blue")
-                )
-                explanation_text = ""
+                translated_command, assistance = await self.translate_nl(nl_query)
+                source = ""
+            self.query_one("#command_content", Static).update(
+                Panel(f"Natural language: {cmd}\n\nBash: {translated_command}{source}", title="Command", border_style="green")
+            )
+            if translated_command.startswith("Error") or translated_command.startswith("(empty"):
                 self.query_one("#explanation_content", Static).update(
                     Panel("(no explanation)", title="Explanation", border_style="blue")
                 )
-                output_text = run_command(cmd)
-                self.query_one("#output_content", Static).update(
-                    Panel(output_text, title="Output / Dry Run", border_style="magenta")
-                )
-                history_entry = {
-                    "timestamp": datetime.now(),
-                    "command": cmd,
-                    "translated_command": translated_command,
-                    "explanation": explanation_text,
-                    "output": output_text
-                }
-                self.user.add_history_and_log(history_entry)
-            if translated_command.startswith("Error") or translated_command.startswith("(empty"):
-                self.query_one("#output_content", Static).update(
-                    Panel(translated_command, title="Output / Dry Run", border_style="red")
+                self.query_one("#output", OutputView).show(
+                    translated_command, title="Output / Dry Run", border_style="red"
                 )
+                self.query_one("#prompt_input", Input).focus()
                 return
-        else:
+
+        # The explanation, the command itself and the suggestions only depend on
+        # the (translated) command, so they run side by side and each panel is
+        # updated as soon as its own stage is done.
+        self.explained_command = translated_command
+        assistance = assistance if cmd.startswith("nl:") else None
+        explanation = asyncio.ensure_future(
+            self.show_explanation(translated_command, assistance.explanation if assistance else ""))
+        suggestions = asyncio.ensure_future(
+            self.show_suggestions(translated_command, assistance.suggestions if assistance else None))
+        try:
+            self.show_waiting()
+            streamer = OutputStreamer(self.query_one("#output", OutputView), "Output / Dry Run", "magenta")
+            self.last_result = await run_command(
+                self.shell_session, translated_command, streamer,
+                pty=self.use_pty, columns=self.output_columns(), on_start=streamer.start)
+            streamer.finish(self.last_result.text(), result_title("Output / Dry Run", self.last_result))
+            self.query_one("#prompt_input", Input).focus()
+            if cmd.startswith("nl:") and self.last_result.returncode == 0:
+                self.translations.add(nl_query, translated_command)
+            history_entry = {
+                "timestamp": datetime.now(),
+                "command": cmd,
+                "translated_command": translated_command,
+                "explanation": await explanation if explanation else "",
+                "result": self.last_result
+            }
+            self.user.add_history_and_log(history_entry)
+            await suggestions
+        finally:
+            for task in (explanation, suggestions):
+                if task is not None:
+                    task.cancel()
+
+    async def show_explanation(self, command: str, summary: str = "") -> str:
+        # Local man-page data, after the LLM's summary if the translation came with one;
+        # otherwise the LLM is only asked when the user types `explain`.
+        loop = asyncio.get_running_loop()
+        explanation_text = await loop.run_in_executor(None, explain_command, command)
+        if summary:
+            explanation_text = f"{summary}\n\n{explanation_text}"
+        self.query_one("#explanation_content", Static).update(
+            Panel(Text(explanation_text), title="Explanation (type `explain` for more)", border_style="blue")
+        )
+        return explanation_text
+
+    @work(group="explain", exclusive=True)
+    async def explain_more(self) -> None:
+        command = self.explained_command
+        if not command:
             self.query_one("#explanation_content", Static).update(
-                Panel("Please enter a command to get an explanation.", title="Explanation", border_style="blue")
+                Panel("Run a command first, then type `explain`.", title="Explanation", border_style="blue")
             )
-            self.query_one("#output_content", Static).update(
-                Panel("(no command to run)", title="Output / Dry Run", border_style="magenta")
-            )
-
-        self.query_one("#prompt_input", Input).focus()
+            return
+        loop = asyncio.get_running_loop()
+        local = await loop.run_in_executor(None, explain_command, command)
+        self.query_one("#explanation_content", Static).update(
+            Panel(Text(f"{local}\n\nAsking for a fuller explanation..."), title="Explanation", border_style="blue")
+        )
+        summary = await get_gpt_explanation(command)
+        self.query_one("#explanation_content", Static).update(
+            Panel(Text(f"{summary}\n\n{local}"), title="Explanation", border_style="blue")
+        )
 
-        try:
-            suggestion_prompt = f"Using the previous command '{translated_command}' and its output, suggest 3 useful next bash commands to try."
-            suggestion_completion = await asyncio.to_thread(lambda: openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a shell assistant that recommends 3 helpful follow-up commands based on prior command usage and output."},
-                    {"role": "user", "content": suggestion_prompt}
-                ]
+    async def show_suggestions(self, command: str, suggestions: Optional[List[str]] = None) -> None:
+        if suggestions:
+            self.query_one("#suggestion_content", Static).update(Panel(
+                "\n".join(f"{i}. {s}" for i, s in enumerate(suggestions, 1)),
+                title="Command Suggestions", border_style="yellow"
             ))
-            suggestion_text = suggestion_completion.choices[0].message.content.strip()
+            return
+        if not llm.available:
+            self.query_one("#suggestion_content", Static).update(
+                Panel("(paused: the LLM API is not responding)", title="Command Suggestions", border_style="yellow")
+            )
+            return
+        try:
+            suggestion_prompt = f"Using the previous command '{command}' and its output, suggest 3 useful next bash commands to try."
+            suggestion_text = await llm.chat([
+                {"role": "system", "content": "You are a shell assistant that recommends 3 helpful follow-up commands based on prior command usage and output."},
+                {"role": "user", "content": suggestion_prompt}
+            ], cache=True, site="suggest")
             self.query_one("#suggestion_content", Static).update(
                 Panel(suggestion_text, title="Command Suggestions", border_style="yellow")
             )
@@ -497,22 +776,69 @@ Screen {
             except Exception:
                 pass
 
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """With `speculate on`, translate `nl:` input once typing pauses."""
+        if event.input.id != "prompt_input":
+            return
+        if self.speculate_timer is not None:
+            self.speculate_timer.stop()
+            self.speculate_timer = None
+        text = event.value.strip()
+        if self.speculation is not None and self.speculation[0] != text:
+            # The input was edited away from what is being translated.
+            self.speculation[1].cancel()
+            self.speculation = None
+        if self.speculate and text.startswith("nl:") and text[3:].strip():
+            self.speculate_timer = self.set_timer(SPECULATE_DEBOUNCE, lambda: self.start_speculation(text))
+
+    def start_speculation(self, text: str) -> None:
+        if self.speculation is not None:
+            if self.speculation[0] == text:
+                return
+            self.speculation[1].cancel()
+        nl_query = text[3:].strip()
+        if translate_offline(nl_query) is not None or self.translations.lookup(nl_query):
+            self.speculation = None
+            return
+        self.speculation = (text, asyncio.ensure_future(self.translate_nl(nl_query)))
+
+    def take_speculation(self, text: str) -> Optional[asyncio.Future]:
+        """The speculative translation for exactly ``text``, if there is one; any other is discarded."""
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if speculation[0] == text and not (speculation[1].done() and speculation[1].result()[0].startswith("Error")):
+            return speculation[1]
+        speculation[1].cancel()
+        return None
+
+    async def translate_nl(self, nl_query: str) -> Tuple[str, Optional[Assistance]]:
+        """The command for ``nl_query`` and, in combined mode, its explanation and suggestions."""
+        if COMBINED_NL:
+            assistance = await assist(nl_query)
+            if assistance is not None:
+                return assistance.command, assistance
+        return await self.convert_nl_to_bash(nl_query), None
+
     @staticmethod
-    def convert_nl_to_bash(nl_command: str) -> str:
+    async def convert_nl_to_bash(nl_command: str) -> str:
         try:
             role = "I am going to tell you what I want to do, and you are going to convert it to instructions for a " + platform.system() + " terminal. Return ONLY the command as a plain text string, and nothing else."
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": role},
-                    {"role": "user", "content": nl_command}
-                ]
-            )
-            return response.choices[0].message.content.strip()
+            return await llm.chat([
+                {"role": "system", "content": role},
+                {"role": "user", "content": nl_command}
+            ], cache=True, site="translate")
         except Exception as e:
             return f"Error converting to bash: {e}"
 
-class DevTARA(App):
+class DevTARA(JobControl, App):
+    OUTPUT_ID = "#output_dev_scroll_view"
+    OUTPUT_TITLE = "Command Output"
+    INPUT_ID = "#prompt_input_dev"
+    BINDINGS = [
+        Binding("ctrl+c", "cancel_command", "Cancel command", show=True, priority=True),
+    ]
+
     CSS = """
     Screen {
       layout: vertical;
@@ -541,14 +867,26 @@ class DevTARA(App):
     def __init__(self, user: "User"):
         super().__init__()
         self.user = user          # share the same User object as StudentTARA
+        self.shell_session = ShellSession()
+        self.last_result: Optional[CommandResult] = None
+        self.jobs = JobTable()
+        self.use_pty = USE_PTY
+        self.suggest_timer: Optional[Timer] = None
+        self.suggested_for = ""
 
     def on_mount(self) -> None:
         self.command_history: List[dict] = [] # Type hint
         self.query_one("#prompt_input_dev", Input).focus()
-        # Kickstart asyncio event loop in Textual and start suggestion updater
-        self.set_interval(0.1, lambda: None)
-        import asyncio
-        asyncio.create_task(self.update_suggestions_loop())
+        man_index.refresh_in_background()
+        llm.telemetry.listeners.append(self.user.log_llm_call)
+
+    async def on_unmount(self) -> None:
+        self.jobs.kill_all()
+        await self.shell_session.close()
+        remove_spill_files()
+        llm.telemetry.listeners.remove(self.user.log_llm_call)
+        self.user.log_llm_stats(describe_llm_stats())
+        await llm.aclose()
 
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True, name="Developer TARA")
@@ -582,14 +920,7 @@ class DevTARA(App):
                 id="suggestion_dev_scroll_view",
             )
 
-        yield ScrollView(
-            Static(
-                RichPanel("(no output yet)", title="Command Output", border_style="magenta"),
-                id="output_dev_content_static",
-                expand=True,
-            ),
-            id="output_dev_scroll_view",
-        )
+        yield OutputView("(no output yet)", title="Command Output", id="output_dev_scroll_view")
 
         yield Input(
             placeholder="> Type your command, 'vfo', 'help', or 'quit'",
@@ -609,23 +940,58 @@ class DevTARA(App):
             ## 🆘 Help - Available Commands
 
             - `vfo` or `Ctrl+H` — Show log‑file location (full session output).
+            - `full` — Show where the untruncated output of the last command is stored
+            - `[command] &` — Run a command in the background; `jobs`, `fg %N` and `kill %N` manage it
+            - `Ctrl+C` — Interrupt the running command (set `TARA_COMMAND_TIMEOUT` for a time limit)
+            - `pty on` / `pty off` — Run commands on a pseudo-terminal so colours and progress output work
+            - `stats` — Show latency, token and cache statistics of LLM calls
             - `quit` — Exit the program
             - `[any valid command]` — Run that command and show explanation/output
             """
-            self.query_one("#output_dev_content_static", Static).update(
-                RichPanel(help_text.strip(), title="Help", border_style="cyan")
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                help_text.strip(), title="Help", border_style="cyan"
             )
             self.query_one("#prompt_input_dev", Input).focus()
             return
 
         if cmd.lower() == "vfo":
-            self.query_one("#output_dev_content_static", Static).update(
-                RichPanel(f"Full session log saved at:\n{self.user.log_file_path}",
-                          title="Log Location", border_style="cyan")
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                f"Full session log saved at:\n{self.user.log_file_path}",
+                title="Log Location", border_style="cyan"
             )
             self.query_one("#prompt_input_dev", Input).focus()
             return
 
+        if cmd.lower() in ("pty", "pty on", "pty off"):
+            if cmd.lower() != "pty":
+                self.use_pty = cmd.lower() == "pty on"
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                f"PTY mode is {'on' if self.use_pty else 'off'}.", title="Command Output", border_style="cyan"
+            )
+            self.query_one("#prompt_input_dev", Input).focus()
+            return
+
+        if cmd.lower() == "full":
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                describe_full_output(self.last_result), title="Full Output", border_style="cyan"
+            )
+            self.query_one("#prompt_input_dev", Input).focus()
+            return
+
+        if cmd.lower() == "stats":
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                describe_llm_stats(), title="LLM Stats", border_style="cyan"
+            )
+            self.query_one("#prompt_input_dev", Input).focus()
+            return
+
+        if self.handle_job_builtin(cmd):
+            return
+
+        self.process_command(cmd)
+
+    @work(group="command")
+    async def process_command(self, cmd: str) -> None:
         self.query_one("#interpreted_content_static", Static).update(
             RichPanel(f"> {cmd if cmd else 'No command entered'}", title="Interpreted Command", border_style="green")
         )
@@ -635,7 +1001,6 @@ class DevTARA(App):
         # ----- END SUGGESTIONS LOGIC -----
 
         explanation_text = "N/A"
-        output_text = "(no command to run)" # Default
 
         if cmd:
             self.query_one("#explanation_dev_content_static", Static).update(
@@ -646,16 +1011,18 @@ class DevTARA(App):
                 RichPanel("(no explanation)", title="Warnings", border_style="red")
             )
 
-            output_text = run_command(cmd)
-            self.query_one("#output_dev_content_static", Static).update(
-                RichPanel(output_text, title="Command Output", border_style="magenta")
-            )
+            self.show_waiting()
+            streamer = OutputStreamer(self.query_one("#output_dev_scroll_view", OutputView), "Command Output", "magenta")
+            self.last_result = await run_command(
+                self.shell_session, cmd, streamer,
+                pty=self.use_pty, columns=self.output_columns(), on_start=streamer.start)
+            streamer.finish(self.last_result.text(), result_title("Command Output", self.last_result))
 
             history_entry = {
                 "timestamp": datetime.now(),
                 "command": cmd,
                 "explanation": explanation_text,
-                "output": output_text
+                "result": self.last_result
             }
             self.command_history.append(history_entry)
             self.user.add_history_and_log(history_entry)
@@ -663,36 +1030,47 @@ class DevTARA(App):
             self.query_one("#explanation_dev_content_static", Static).update(
                 RichPanel("Please enter a command to get an explanation.", title="Warnings", border_style="red")
             )
-            self.query_one("#output_dev_content_static", Static).update(
-                RichPanel("(no command to run)", title="Command Output", border_style="magenta")
+            self.query_one("#output_dev_scroll_view", OutputView).show(
+                "(no command to run)", title="Command Output", border_style="magenta"
             )
         self.query_one("#prompt_input_dev", Input).focus()
 
-    async def update_suggestions_loop(self):
-        import asyncio
-        import openai
-        while True:
-            await asyncio.sleep(3)
-            try:
-                input_widget = self.query_one("#prompt_input_dev", Input)
-                cmd = input_widget.value.strip()
-                if cmd:
-                    suggestion_prompt = f"Using the previous command '{cmd}' and its output, suggest 3 useful next bash commands to try."
-                    suggestion_completion = await asyncio.to_thread(lambda: openai.ChatCompletion.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {"role": "system", "content": "You are a shell assistant that recommends 3 helpful follow-up commands based on prior command usage and output."},
-                            {"role": "user", "content": suggestion_prompt}
-                        ]
-                    ))
-                    suggestion_text = suggestion_completion.choices[0].message.content.strip()
-                    self.query_one("#suggestion_dev_static", Static).update(
-                        RichPanel(suggestion_text, title="Command Suggestions", border_style="yellow")
-                    )
-            except Exception as e:
-                self.query_one("#suggestion_dev_static", Static).update(
-                    RichPanel(f"Error: {e}", title="Command Suggestions", border_style="red")
-                )
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """Ask for suggestions once typing pauses for SUGGEST_DEBOUNCE seconds."""
+        if event.input.id != "prompt_input_dev":
+            return
+        if self.suggest_timer is not None:
+            self.suggest_timer.stop()
+        # Suggestions for what was typed before are no longer wanted.
+        self.workers.cancel_group(self, "suggestions")
+        cmd = event.value.strip()
+        if not cmd or cmd == self.suggested_for:
+            self.suggest_timer = None
+            return
+        self.suggest_timer = self.set_timer(SUGGEST_DEBOUNCE, lambda: self.update_suggestions(cmd))
+
+    @work(group="suggestions", exclusive=True)
+    async def update_suggestions(self, cmd: str) -> None:
+        # Exclusive: a newer request cancels one still waiting for its answer.
+        if not llm.available:
+            self.query_one("#suggestion_dev_static", Static).update(
+                RichPanel("(paused: the LLM API is not responding)", title="Command Suggestions", border_style="yellow")
+            )
+            return
+        try:
+            suggestion_prompt = f"Using the previous command '{cmd}' and its output, suggest 3 useful next bash commands to try."
+            suggestion_text = await llm.chat([
+                {"role": "system", "content": "You are a shell assistant that recommends 3 helpful follow-up commands based on prior command usage and output."},
+                {"role": "user", "content": suggestion_prompt}
+            ], cache=True, site="suggest")
+            self.suggested_for = cmd
+            self.query_one("#suggestion_dev_static", Static).update(
+                RichPanel(suggestion_text, title="Command Suggestions", border_style="yellow")
+            )
+        except Exception as e:
+            self.query_one("#suggestion_dev_static", Static).update(
+                RichPanel(f"Error: {e}", title="Command Suggestions", border_style="red")
+            )
 
 class User:
     def __init__(self):
@@ -703,6 +1081,8 @@ class User:
         logs_dir = "logs"
         os.makedirs(logs_dir, exist_ok=True)
         self.save_location = os.path.join(logs_dir, f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
+        # The full output of truncated commands stays next to the log, which points at it.
+        keep_output_in(os.path.splitext(self.save_location)[0] + "_output")
 
         self.log_file = open(self.save_location, "a")
         self.log_file.write(f"Session started at {datetime.now().strftime('%Y-%m-%d %H-%M-%S')}\n")
@@ -746,18 +1126,37 @@ class User:
     def add_history_and_log(self, entry: dict):
         """Append entry to in‑memory history and dump full command + output to the log."""
         self.command_history.append(entry)
+        result = entry.get("result")
         try:
             self.log_file.write(
                 f"\n[{entry['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}]\n"
                 f"CMD: {entry['command']}\n"
                 "OUTPUT:\n"
-                f"{entry.get('output', '').rstrip()}\n"
-                "-----\n"
+                f"{result.text().rstrip() if result else ''}\n"
+                + "".join(f"Full output: {path}\n" for path in (result.output_files if result else []))
+                + (f"Usage: {result.usage.summary()}\n" if result and result.usage else "")
+                + "-----\n"
             )
             self.log_file.flush()
         except Exception as e:
             print(f"Could not write command to log: {e}", file=sys.stderr)
 
+    def log_llm_call(self, call: CallRecord):
+        """Write one line per LLM call, so slow or failing calls can be traced afterwards."""
+        try:
+            self.log_file.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LLM call: {call.summary()}\n")
+            self.log_file.flush()
+        except Exception as e:
+            print(f"Could not write LLM call to log: {e}", file=sys.stderr)
+
+    def log_llm_stats(self, stats: str):
+        """Append the session's LLM statistics (see the `stats` builtin) to the log."""
+        try:
+            self.log_file.write(f"\nLLM stats at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}:\n{stats}\n-----\n")
+            self.log_file.flush()
+        except Exception as e:
+            print(f"Could not write LLM stats to log: {e}", file=sys.stderr)
+
 RED = '\033[91m'
 GREEN = '\033[92m'
 BLUE = '\033[94m'
@@ -0,0 +1,87 @@
+import math
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Most recent calls per call site that the statistics are computed over.
+WINDOW = int(os.getenv("TARA_STATS_WINDOW", "500"))
+
+
+class CallRecord(NamedTuple):
+    """One LLM call as seen by its caller."""
+
+    site: str                 # translate, explain, suggest, chat, ...
+    ttfb: Optional[float]     # seconds until the first byte of the reply
+    total: float              # seconds until the whole reply (or the error)
+    prompt_tokens: int
+    completion_tokens: int
+    cache: str                # "hit", "miss", "shared" (joined an identical call) or "" if not cached
+    error: str                # kind of failure, "" on success
+
+    def summary(self) -> str:
+        ttfb = f"{self.ttfb:.2f}s" if self.ttfb is not None else "-"
+        return (f"site={self.site} ttfb={ttfb} total={self.total:.2f}s "
+                f"tokens={self.prompt_tokens}+{self.completion_tokens} "
+                f"cache={self.cache or '-'} error={self.error or '-'}")
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (``p`` in 0-100) of ``values``; None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class Telemetry:
+    """Rolling statistics about LLM calls, per call site.
+
+    Every call is passed to ``listeners`` (e.g. the session log) as it is
+    recorded; the last ``window`` calls of each site are kept for ``report``.
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.calls: Dict[str, Deque[CallRecord]] = {}
+        self.listeners: List[Callable[[CallRecord], None]] = []
+
+    def record(self, call: CallRecord) -> None:
+        self.calls.setdefault(call.site, deque(maxlen=self.window)).append(call)
+        for listener in self.listeners:
+            listener(call)
+
+    def report(self) -> str:
+        """A table of calls, errors, cache hit rate, latency percentiles and tokens per site."""
+        if not self.calls:
+            return "No LLM calls yet."
+        lines = [f"{'site':<13}{'calls':>6}{'errors':>7}{'cache hit':>10}  "
+                 f"{'ttfb p50/p90/p99':<20}{'total p50/p90/p99':<20}{'tokens in/out':>14}"]
+        for site, calls in sorted(self.calls.items()):
+            done = [c for c in calls if not c.error]
+            lookups = [c for c in calls if c.cache in ("hit", "miss")]
+            hit_rate = (f"{sum(c.cache == 'hit' for c in lookups) / len(lookups):.0%}" if lookups else "-")
+            sent = [c for c in done if c.cache not in ("hit", "shared")]
+            tokens = (f"{sum(c.prompt_tokens for c in sent) // len(sent)}/"
+                      f"{sum(c.completion_tokens for c in sent) // len(sent)}" if sent else "-")
+            lines.append(
+                f"{site:<13}{len(calls):>6}{len(calls) - len(done):>7}{hit_rate:>10}  "
+                f"{_percentiles([c.ttfb for c in done if c.ttfb is not None]):<20}"
+                f"{_percentiles([c.total for c in done]):<20}{tokens:>14}"
+            )
+        errors: Dict[str, int] = {}
+        for calls in self.calls.values():
+            for call in calls:
+                if call.error:
+                    errors[call.error] = errors.get(call.error, 0) + 1
+        if errors:
+            lines.append("")
+            lines.append("Errors: " + ", ".join(f"{kind} ×{count}" for kind, count in sorted(errors.items())))
+        lines.append("")
+        lines.append(f"Last {self.window} calls per site; tokens are averages per call sent to the API.")
+        return "\n".join(lines)
+
+
+def _percentiles(values: List[float]) -> str:
+    if not values:
+        return "-"
+    return "/".join(f"{percentile(values, p):.2f}" for p in (50, 90, 99)) + "s"
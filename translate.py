@@ -0,0 +1,447 @@
+import os
+import platform
+import re
+import shlex
+import sqlite3
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from llm_cache import CACHE_DIR, open_database
+
+INDEX_PATH = os.getenv("TARA_NL_INDEX_PATH", os.path.join(CACHE_DIR, "translations.sqlite3"))
+MAX_TRANSLATIONS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    normalized TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    command TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+# Words that do not change what a request asks for.
+_STOPWORDS = {
+    "a", "an", "the", "please", "me", "my", "i", "you", "can", "could", "would", "want", "to",
+    "need", "how", "do", "what", "is", "are", "of", "in", "on", "this", "current", "here", "that",
+    "which", "all", "every", "some", "command", "just", "and",
+}
+_SYNONYMS = {
+    "show": "list", "display": "list", "print": "list", "view": "list", "get": "list", "see": "list",
+    "sorted": "sort", "ordered": "sort", "order": "sort", "sorting": "sort",
+    "directory": "folder", "dir": "folder", "directories": "folder", "folders": "folder",
+    "delete": "remove", "erase": "remove", "rm": "remove",
+    "biggest": "largest", "big": "large", "bigger": "larger",
+    "locate": "find", "search": "find", "look": "find",
+    "make": "create", "new": "create",
+}
+_WORD = re.compile(r"[\w./~*-]+")
+
+
+def _tokens(query: str) -> List[str]:
+    tokens = []
+    for word in _WORD.findall(query.lower()):
+        word = _SYNONYMS.get(word, word)
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and word.isalpha():
+            word = word[:-1]
+        tokens.append(_SYNONYMS.get(word, word))
+    return tokens
+
+
+class Match(NamedTuple):
+    query: str
+    command: str
+
+
+def _key(query: str) -> str:
+    return " ".join(sorted(set(_tokens(query))))
+
+
+class TranslationIndex:
+    """Past ``nl:`` queries and the bash commands they were translated to.
+
+    Queries are normalized (case, punctuation, stop words, a few synonyms and
+    plurals, word order) and a translation is only reused for a query with
+    exactly the same remaining words: requests that differ in a single word
+    ("ascending"/"descending", "start"/"stop") can want opposite commands, and
+    the reused command runs without asking. Only translations whose command
+    succeeded are added, and the index is kept on disk so it grows across
+    sessions.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, max_entries: int = MAX_TRANSLATIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Optional[Dict[str, Match]] = None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _load(self) -> Dict[str, Match]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                self._db = open_database(self.path, _SCHEMA)
+                rows = self._db.execute("SELECT query, command FROM translations ORDER BY last_used").fetchall()
+            except (OSError, sqlite3.Error):
+                self._db, rows = None, []
+            for query, command in rows:
+                self._insert(query, command)
+        return self._entries
+
+    def _insert(self, query: str, command: str) -> str:
+        key = _key(query)
+        self._entries[key] = Match(query, command)
+        return key
+
+    def lookup(self, query: str) -> Optional[Match]:
+        """The previous translation of a query that normalizes to the same words as ``query``."""
+        key = _key(query)
+        return self._load().get(key) if key else None
+
+    def add(self, query: str, command: str) -> None:
+        """Remember that ``query`` was successfully translated to ``command``."""
+        entries = self._load()
+        key = self._insert(query, command)
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO translations (normalized, query, command, last_used) VALUES (?, ?, ?, ?)",
+                (key, query, command, time.time()),
+            )
+            if len(entries) > self.max_entries * 1.1:
+                self._db.execute(
+                    "DELETE FROM translations WHERE normalized IN "
+                    "(SELECT normalized FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._entries = None
+        except sqlite3.Error:
+            pass
+
+
+# Offline translation -----------------------------------------------------------
+#
+# Rules are regular expressions matched against the whole (cleaned up) query.
+# Named groups are the slots: ``file``, ``dir``, ``ext``, ``size``/``unit``,
+# ``n``, ``name``, ``pid``, ``text``, ``src``/``dst``. A rule's builder turns
+# the slots into a command for the current platform, or returns None to let
+# the next rule (and eventually the LLM) handle the query.
+
+_Builder = Callable[[Dict[str, str], str], Optional[str]]
+_RULES: List[Tuple[Pattern[str], _Builder]] = []
+
+_FILLER = re.compile(
+    r"^(?:(?:please|can you|could you|would you|how (?:do|can) i|i (?:want|need) to|help me|"
+    r"show me|tell me|give me|let me see|what is|what's|what are)\s+)+", re.IGNORECASE)
+# Lower case only, so a file called "My notes.txt" keeps its name; whole
+# words only, so "~/my docs" does too.
+_ARTICLES = re.compile(r"(?<!\S)(?:the|a|an|my|all(?: of)?(?: the)?)\s+")
+# Quoted text is searched for as typed, so it is left out of the clean-up.
+# Not after a letter, so the apostrophe in "what's" does not open a quote.
+_QUOTED = re.compile(r"""((?<!\w)"[^"]*"|(?<!\w)'[^']*')""")
+
+_PATH = r"[\w./~*+-]+"
+_HERE = r"(?:\s+(?:in|under|inside)\s+(?:(?:this|current|here)\s*(?:dir|directory|folder)?|(?P<dir>" + _PATH + r")))?"
+_EXTENSIONS = {
+    "python": "py", "javascript": "js", "typescript": "ts", "text": "txt", "markdown": "md", "c": "c",
+    "java": "java", "shell": "sh", "bash": "sh", "json": "json", "yaml": "yml", "html": "html",
+    "css": "css", "csv": "csv", "log": "log", "pdf": "pdf", "image": "png", "rust": "rs", "go": "go",
+}
+
+
+def _rule(*patterns: str) -> Callable[[_Builder], _Builder]:
+    def register(build: _Builder) -> _Builder:
+        for pattern in patterns:
+            _RULES.append((re.compile(pattern, re.IGNORECASE), build))
+        return build
+    return register
+
+
+def _q(path: str) -> str:
+    # A leading ~ stays outside the quotes, or the shell would not expand it.
+    if path == "~" or path == "~/":
+        return path
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+def _where(slots: Dict[str, str]) -> str:
+    return _q(slots["dir"]) if slots.get("dir") else "."
+
+
+def _ext(word: str) -> str:
+    word = word.lower().lstrip("*").lstrip(".")
+    return _EXTENSIONS.get(word, word)
+
+
+def _find_size(number: str, unit: str) -> str:
+    unit = (unit or "k")[0].upper()
+    value = float(number)
+    if not value.is_integer():
+        # find only takes whole numbers; step down a unit (kilobytes to bytes).
+        value, unit = value * 1024, {"G": "M", "M": "k", "K": "c"}[unit]
+    return f"+{int(value)}{'k' if unit == 'K' else unit}"
+
+
+@_rule(r"(?:(?:list|show|display|ls)\s+)?files?" + _HERE, r"ls",
+       r"what(?:'s| is)\s+(?:here|(?:in|inside)\s+(?:(?:this|current|here)\s*(?:dir|directory|folder)?|(?P<dir>" + _PATH + r")))")
+def _list_files(slots, system):
+    return f"ls {_q(slots['dir'])}" if slots.get("dir") else "ls"
+
+
+@_rule(r"(?:list|show|display)\s+(?:files?\s+)?(?:including|with)\s+hidden(?:\s+files?)?" + _HERE,
+       r"(?:list|show|display)\s+hidden\s+files?" + _HERE)
+def _list_hidden(slots, system):
+    return f"ls -la {_q(slots['dir'])}" if slots.get("dir") else "ls -la"
+
+
+@_rule(r"(?:list|show|display|sort)\s+files?\s+(?:sorted\s+|ordered\s+)?by\s+(?P<key>size|date|time|modification(?: time)?|name)" + _HERE)
+def _list_sorted(slots, system):
+    flag = {"size": "-lS", "name": "-l"}.get(slots["key"].lower(), "-lt")
+    return f"ls {flag} {_q(slots['dir'])}" if slots.get("dir") else f"ls {flag}"
+
+
+@_rule(r"(?:list|show|find)\s+(?:(?P<n>\d+)\s+)?(?:largest|biggest)\s+files?" + _HERE)
+def _largest_files(slots, system):
+    return f"find {_where(slots)} -type f -exec du -h {{}} + | sort -rh | head -n {slots.get('n') or 10}"
+
+
+@_rule(r"(?:show\s+|check\s+)?(?:disk\s+(?:usage|space)|free\s+(?:disk\s+)?space|df)",
+       r"how much (?:free\s+)?(?:disk\s+)?space(?:\s+is\s+(?:left|free))?")
+def _disk_usage(slots, system):
+    return "df -h"
+
+
+@_rule(r"(?:show\s+|check\s+)?(?:size|disk usage)\s+of\s+(?:this|current)\s+(?:dir|directory|folder)",
+       r"how big is\s+(?:this|current)\s+(?:dir|directory|folder)",
+       r"(?:show\s+|check\s+)?(?:size|disk usage)\s+of\s+(?P<dir>" + _PATH + r")",
+       r"how big is\s+(?P<dir>" + _PATH + r")")
+def _dir_size(slots, system):
+    return f"du -sh {_where(slots)}"
+
+
+@_rule(r"find\s+files?\s+(?:named|called)\s+(?P<file>" + _PATH + r")" + _HERE,
+       r"(?:find|locate|search for)\s+(?P<file>[\w+-]+\.\w+)" + _HERE)
+def _find_by_name(slots, system):
+    return f"find {_where(slots)} -name {_q(slots['file'])}"
+
+
+@_rule(r"(?:find|list|show)\s+(?:files?\s+)?(?:with\s+)?(?:extension\s+)?\*?\.(?P<ext>\w+)(?:\s+files?)?" + _HERE,
+       r"(?:find|list|show)\s+(?P<ext>" + "|".join(_EXTENSIONS) + r")\s+files?" + _HERE,
+       r"(?:find|list|show)\s+files?\s+ending\s+(?:in|with)\s+\.?(?P<ext>\w+)" + _HERE)
+def _find_by_extension(slots, system):
+    return f"find {_where(slots)} -type f -name {_q('*.' + _ext(slots['ext']))}"
+
+
+@_rule(r"(?:find|list|show)\s+files?\s+(?:larger|bigger|greater)\s+than\s+(?P<size>\d+(?:\.\d+)?)\s*(?P<unit>[kmg])b?" + _HERE)
+def _find_by_size(slots, system):
+    return f"find {_where(slots)} -type f -size {_find_size(slots['size'], slots['unit'])}"
+
+
+@_rule(r"(?:find|list|show)\s+files?\s+(?:modified|changed|edited)\s+(?:in\s+)?(?:the\s+)?(?:last|past)\s+(?P<n>\d+)\s+days?" + _HERE)
+def _find_recent(slots, system):
+    return f"find {_where(slots)} -type f -mtime -{slots['n']}"
+
+
+@_rule(r"count\s+(?:the\s+)?(?:number\s+of\s+)?lines\s+(?:in|of)\s+(?P<file>" + _PATH + r")",
+       r"how many lines (?:are\s+)?in\s+(?P<file>" + _PATH + r")")
+def _count_lines(slots, system):
+    return f"wc -l {_q(slots['file'])}"
+
+
+@_rule(r"count\s+(?:the\s+)?lines\s+(?:in|of)\s+(?P<ext>" + "|".join(_EXTENSIONS) + r"|\*?\.\w+)\s+files?" + _HERE)
+def _count_lines_by_extension(slots, system):
+    return f"find {_where(slots)} -type f -name {_q('*.' + _ext(slots['ext']))} -exec cat {{}} + | wc -l"
+
+
+@_rule(r"count\s+(?:the\s+)?(?:number\s+of\s+)?files" + _HERE, r"how many files(?:\s+are there)?" + _HERE)
+def _count_files(slots, system):
+    return f"find {_where(slots)} -type f | wc -l"
+
+
+@_rule(r"(?:show|print|display|read|cat|open)\s+(?:(?:the\s+)?contents?\s+of\s+)?(?:file\s+)?(?P<file>[\w./~+-]+\.\w+)")
+def _show_file(slots, system):
+    return f"cat {_q(slots['file'])}"
+
+
+@_rule(r"(?:show\s+)?(?:the\s+)?(?P<end>first|last|top|bottom)\s+(?P<n>\d+)\s+lines\s+(?:of|in|from)\s+(?P<file>" + _PATH + r")")
+def _head_tail(slots, system):
+    program = "head" if slots["end"].lower() in ("first", "top") else "tail"
+    return f"{program} -n {slots['n']} {_q(slots['file'])}"
+
+
+@_rule(r"(?:search|grep|look)\s+(?:for\s+)?[\"'](?P<text>[^\"']+)[\"']" + r"(?:\s+in\s+(?P<dir>" + _PATH + r"))?",
+       r"(?:find|search)\s+(?:files?\s+)?containing\s+[\"'](?P<text>[^\"']+)[\"']" + r"(?:\s+in\s+(?P<dir>" + _PATH + r"))?")
+def _grep(slots, system):
+    return f"grep -rn {shlex.quote(slots['text'])} {_where(slots)}"
+
+
+@_rule(r"(?:list|show|display)\s+(?:running\s+)?process(?:es)?", r"what(?:'s| is) running")
+def _processes(slots, system):
+    return "ps aux"
+
+
+@_rule(r"(?:find|is)\s+(?:process\s+)?(?P<name>[\w.-]+)\s+running", r"find\s+(?:the\s+)?process\s+(?P<name>[\w.-]+)")
+def _find_process(slots, system):
+    return f"pgrep -fl {_q(slots['name'])}"
+
+
+@_rule(r"(?:kill|stop|end)\s+process\s+(?P<pid>\d+)", r"kill\s+(?P<pid>\d+)")
+def _kill_pid(slots, system):
+    return f"kill {slots['pid']}"
+
+
+# Only explicit forms: "stop it" or "end my session" must not become a pkill.
+@_rule(r"(?:kill|stop)\s+(?:the\s+)?process(?:es)?\s+(?:named|called)\s+(?P<name>[a-z][\w.-]*)",
+       r"(?:kill|stop)\s+(?:the\s+)?(?P<name>[a-z][\w.-]*)\s+process(?:es)?")
+def _kill_name(slots, system):
+    # Exact name: a bare pkill pattern matches every process whose name contains it.
+    return f"pkill -x {_q(slots['name'])}"
+
+
+@_rule(r"(?:show\s+)?(?:current|working|present)\s+(?:working\s+)?(?:dir|directory|folder)", r"where am i", r"pwd")
+def _pwd(slots, system):
+    return "pwd"
+
+
+@_rule(r"who am i", r"(?:show\s+)?(?:current\s+)?(?:user|username)")
+def _whoami(slots, system):
+    return "whoami"
+
+
+@_rule(r"(?:show\s+|check\s+)?(?:memory|ram)(?:\s+usage)?", r"(?:free|available)\s+(?:memory|ram)")
+def _memory(slots, system):
+    return "vm_stat" if system == "Darwin" else "free -h"
+
+
+@_rule(r"(?:show\s+)?(?:my\s+)?ip(?:\s+address(?:es)?)?")
+def _ip(slots, system):
+    return "ifconfig | grep 'inet '" if system == "Darwin" else "ip -brief address"
+
+
+@_rule(r"(?:show|list)\s+(?:open|listening)\s+ports", r"what ports are (?:open|listening)")
+def _ports(slots, system):
+    return "lsof -iTCP -sTCP:LISTEN -n -P" if system == "Darwin" else "ss -tuln"
+
+
+@_rule(r"(?:show\s+)?(?:current\s+)?(?:date|time|date and time)", r"what time is it")
+def _date(slots, system):
+    return "date"
+
+
+@_rule(r"(?:show\s+)?uptime", r"how long has (?:the\s+)?(?:system|computer|machine) been (?:up|running)")
+def _uptime(slots, system):
+    return "uptime"
+
+
+@_rule(r"(?:show\s+)?(?:os|system|kernel)\s+(?:version|info|information)", r"which os")
+def _uname(slots, system):
+    return "uname -a"
+
+
+@_rule(r"(?:show|list|print)\s+environment(?:\s+variables)?", r"(?:show|list|print)\s+env(?:\s+vars?)?")
+def _env(slots, system):
+    return "env"
+
+
+@_rule(r"(?:show|print)\s+(?:my\s+)?path(?:\s+variable)?")
+def _path(slots, system):
+    return 'echo "$PATH"'
+
+
+@_rule(r"(?:create|make)\s+(?:a\s+)?(?:new\s+)?(?:dir|directory|folder)\s+(?:named\s+|called\s+)?(?P<dir>" + _PATH + r")",
+       r"mkdir\s+(?P<dir>" + _PATH + r")")
+def _mkdir(slots, system):
+    return f"mkdir -p {_q(slots['dir'])}"
+
+
+@_rule(r"(?:create|make)\s+(?:a\s+)?(?:new\s+)?(?:empty\s+)?file\s+(?:named\s+|called\s+)?(?P<file>" + _PATH + r")")
+def _touch(slots, system):
+    return f"touch {_q(slots['file'])}"
+
+
+@_rule(r"(?:go|change|move)\s+(?:up|back)(?:\s+one)?(?:\s+(?:level|directory|folder|dir))?",
+       r"(?:go|change)\s+to\s+(?:the\s+)?parent\s+(?:dir|directory|folder)")
+def _cd_up(slots, system):
+    return "cd .."
+
+
+@_rule(r"(?:go|change|switch)\s+(?:to\s+)?(?:my\s+)?home(?:\s+(?:dir|directory|folder))?")
+def _cd_home(slots, system):
+    return "cd ~"
+
+
+@_rule(r"(?:go|change|switch|cd)\s+(?:directory\s+)?(?:in)?to\s+(?:the\s+)?(?:(?:dir|directory|folder)\s+)?(?P<dir>" + _PATH + r")")
+def _cd(slots, system):
+    return f"cd {_q(slots['dir'])}"
+
+
+@_rule(r"(?:copy|cp)\s+(?P<src>" + _PATH + r")\s+(?:to|into)\s+(?P<dst>" + _PATH + r")")
+def _copy(slots, system):
+    return f"cp -r {_q(slots['src'])} {_q(slots['dst'])}"
+
+
+@_rule(r"(?:move|rename|mv)\s+(?P<src>" + _PATH + r")\s+(?:to|into|as)\s+(?P<dst>" + _PATH + r")")
+def _move(slots, system):
+    return f"mv {_q(slots['src'])} {_q(slots['dst'])}"
+
+
+@_rule(r"(?:compress|zip|archive|tar)\s+(?:up\s+)?(?:(?:dir|directory|folder|file)\s+)?(?P<file>" + _PATH + r")")
+def _compress(slots, system):
+    name = slots["file"].rstrip("/")
+    return f"tar -czf {_q(os.path.basename(name) + '.tar.gz')} {_q(name)}"
+
+
+@_rule(r"(?:extract|unzip|unpack|decompress|untar)\s+(?P<file>" + _PATH + r")")
+def _extract(slots, system):
+    name = slots["file"]
+    return f"unzip {_q(name)}" if name.lower().endswith(".zip") else f"tar -xf {_q(name)}"
+
+
+@_rule(r"make\s+(?P<file>" + _PATH + r")\s+executable")
+def _chmod_x(slots, system):
+    return f"chmod +x {_q(slots['file'])}"
+
+
+@_rule(r"(?:show\s+)?git\s+status", r"(?:what|which files)\s+(?:has|have)\s+changed")
+def _git_status(slots, system):
+    return "git status"
+
+
+@_rule(r"(?:show\s+)?(?:(?:the\s+)?last\s+(?P<n>\d+)\s+)?(?:git\s+)?commits?(?:\s+history)?", r"(?:show\s+)?git\s+log")
+def _git_log(slots, system):
+    return f"git log --oneline -n {slots.get('n') or 10}"
+
+
+def _clean(query: str, strip_filler: bool = True) -> str:
+    # Odd parts are quoted text.
+    parts = _QUOTED.split(query.strip().rstrip("?.!"))
+    for i in range(0, len(parts), 2):
+        part = re.sub(r"\s+", " ", parts[i])
+        if i == 0 and strip_filler:
+            part = _FILLER.sub("", part)
+        parts[i] = _ARTICLES.sub("", part)
+    return "".join(parts).strip()
+
+
+def translate_offline(query: str, system: Optional[str] = None) -> Optional[str]:
+    """Translate a common request with the built-in rules, or return None.
+
+    Needs neither the network nor the LLM; commands are adapted to
+    ``system`` (``platform.system()`` by default).
+    """
+    system = system or platform.system()
+    if system == "Windows":
+        return None
+    # Some rules need the filler words ("what's running"), so try the query with them too.
+    for text in dict.fromkeys((_clean(query), _clean(query, strip_filler=False))):
+        for pattern, build in _RULES:
+            match = pattern.fullmatch(text)
+            if match:
+                command = build({k: v for k, v in match.groupdict().items() if v is not None}, system)
+                if command:
+                    return command
+    return None